@@ -0,0 +1,243 @@
+""" Answer event analytics for Quizzer.
+
+    Reads answer event logs (see eventlog) and reports, for each question
+    (by id; see Quiz.by_id), how often it is answered wrongly, the most
+    common wrong answers and percentiles of the time taken to answer.
+
+    The logs are read in a single streaming pass. Each file is split into
+    chunks which are summarised in parallel by a process pool, and the
+    summaries are merged as they arrive. Memory use depends on the number
+    of questions, not the size of the logs: the answer times are kept as
+    log scale histograms, and the wrong answers as a fixed number of
+    approximate counters (the "space saving" algorithm).
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import argparse
+import json
+import os
+import sys
+from multiprocessing import Pool, cpu_count
+
+from answermatch import normalize
+from profiler import Histogram
+from quizlibrary import find_files
+
+# Size of the pieces that log files are split into
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Sub-buckets per power of two in the answer time histograms
+PRECISION = 3
+
+# Percentiles of the answer times to report
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class TopCounter(object):
+    """ Approximate counts of the most common items
+
+        At most 'capacity' items are counted; when a new item is seen and
+        there is no room, it replaces the least common item and takes over
+        it's count. Counts are therefore overestimates, but any item more
+        common than 1/capacity of the total is guaranteed to be kept.
+    """
+
+    def __init__(self, capacity):
+        """ Initialise an empty counter """
+
+        self.capacity = capacity
+        self.counts = {} # Item: count
+
+
+    def add(self, item, count=1):
+        """ Count 'item' """
+
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+        else:
+            least = min(self.counts, key=self.counts.get)
+            self.counts[item] = self.counts.pop(least) + count
+
+
+    def merge(self, other):
+        """ Add the counts from 'other', keeping the most common items """
+
+        for item, count in other.counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+        if len(self.counts) > self.capacity:
+            ranked = sorted(self.counts.items(), key=lambda pair: -pair[1])
+            self.counts = dict(ranked[:self.capacity])
+
+
+    def most_common(self, limit):
+        """ Return up to 'limit' (item, count) pairs, most common first """
+
+        ranked = sorted(self.counts.items(),
+                        key=lambda pair: (-pair[1], pair[0]))
+        return ranked[:limit]
+
+
+class QuestionSummary(object):
+    """ The answers to a single question """
+
+    def __init__(self, capacity):
+        """ Initialise an empty summary """
+
+        self.answers = 0
+        self.correct = 0
+        self.times = Histogram(PRECISION)
+        self.wrong_answers = TopCounter(capacity)
+
+
+    def add(self, event):
+        """ Add a single answer event """
+
+        self.answers += 1
+        if event['correct']:
+            self.correct += 1
+        else:
+            self.wrong_answers.add(normalize(event['answer'] or ""))
+        if event.get('latency') != None:
+            self.times.add(event['latency'])
+
+
+    def merge(self, other):
+        """ Add the answers summarised by 'other' """
+
+        self.answers += other.answers
+        self.correct += other.correct
+        self.times.merge(other.times)
+        self.wrong_answers.merge(other.wrong_answers)
+
+
+def split_logs(log_files, chunk_size=CHUNK_SIZE):
+    """ Yield (log file, start, end) byte ranges covering 'log_files' """
+
+    for log_file in log_files:
+        size = os.path.getsize(log_file)
+        for start in range(0, size, chunk_size):
+            yield log_file, start, min(start + chunk_size, size)
+
+
+def summarise_chunk(args):
+    """ Summarise the events starting in a byte range of a log file
+
+        Returns (question summaries, events, bad lines); the summaries are
+        keyed by (quiz, question).
+    """
+
+    log_file, start, end, capacity = args
+
+    summaries = {}
+    events = bad = 0
+    with open(log_file, 'rb') as log:
+        # Start at the first line that starts in the range
+        position = start
+        if start != 0:
+            log.seek(start - 1)
+            position = start - 1 + len(log.readline())
+
+        while position < end:
+            line = log.readline()
+            if len(line) == 0:
+                break
+            position += len(line)
+
+            try:
+                event = json.loads(line.decode('utf-8'))
+                key = (event['quiz'], event['question'])
+            except (ValueError, KeyError, TypeError):
+                bad += 1 # Eg, a line cut short by a crash
+                continue
+
+            if key not in summaries:
+                summaries[key] = QuestionSummary(capacity)
+            summaries[key].add(event)
+            events += 1
+
+    return summaries, events, bad
+
+
+def report(key, summary, top):
+    """ Return a dict reporting on a single question """
+
+    quiz, question = key
+    wrong = summary.answers - summary.correct
+    times = None
+    if summary.times.count != 0:
+        times = dict(("p{}".format(int(percentile * 100)),
+                      round(summary.times.percentile(percentile), 3))
+                     for percentile in PERCENTILES)
+    return {'quiz': quiz,
+            'question': question,
+            'answers': summary.answers,
+            'wrong': wrong,
+            'difficulty': round(float(wrong) / summary.answers, 4),
+            'wrong_answers': summary.wrong_answers.most_common(top),
+            'latency': times}
+
+
+def analyze(paths, output=sys.stdout, jobs=None, top=5):
+    """ Analyze the event logs in 'paths', writing a report to 'output'
+
+        One line of JSON is written per question, hardest first. Returns
+        (events read, lines that could not be read).
+    """
+
+    if jobs == None:
+        jobs = cpu_count()
+    capacity = top * 4 # Spare counters make the top answers more accurate
+
+    chunks = [chunk + (capacity,)
+              for chunk in split_logs(find_files(paths))]
+    summaries = {}
+    events = bad = 0
+    pool = Pool(jobs)
+    try:
+        for chunk_summaries, chunk_events, chunk_bad in \
+                pool.imap_unordered(summarise_chunk, chunks):
+            events += chunk_events
+            bad += chunk_bad
+            for key, summary in chunk_summaries.items():
+                if key in summaries:
+                    summaries[key].merge(summary)
+                else:
+                    summaries[key] = summary
+    finally:
+        pool.close()
+        pool.join()
+
+    reports = [report(key, summary, top)
+               for key, summary in summaries.items()]
+    reports.sort(key=lambda found: (-found['difficulty'], -found['answers'],
+                                    found['quiz'], found['question']))
+    for found in reports:
+        output.write(json.dumps(found, sort_keys=True) + "\n")
+    return events, bad
+
+
+def main():
+    """ Analyze the logs given on the command line """
+
+    parser = argparse.ArgumentParser(
+                description="Report on Quizzer answer event logs")
+    parser.add_argument("logs", nargs='+', metavar="LOG",
+                        help="Log files, or directories of them")
+    parser.add_argument("--top", default=5, type=int,
+                        help="Number of common wrong answers to report")
+    parser.add_argument("--jobs", default=None, type=int,
+                        help="Number of processes to use")
+    args = parser.parse_args()
+
+    events, bad = analyze(args.logs, jobs=args.jobs, top=args.top)
+    sys.stderr.write("{} event(s) read, {} unreadable line(s)\n".format(
+                                                                events, bad))
+
+
+if __name__ == "__main__":
+    main()
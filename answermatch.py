@@ -0,0 +1,157 @@
+""" Answer matching for Quizzer.
+
+    Answers are compared in a normalised form (case, accents, punctuation and
+    whitespace are ignored), optionally allowing a few typos. Symbols (such
+    as the '+' in 'C++' or the '#' in 'C#'), signs and decimal points change
+    the meaning of an answer, so they are kept. A trigram index over the
+    known answers supports fast tab completion.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import re
+import unicodedata
+
+# Punctuation to ignore: anything but a word character, a space or a symbol,
+# except for a hyphen or full stop that is a sign or a decimal point (one
+# before a digit, and for a hyphen not following a word character)
+PUNCTUATION = re.compile(r'[^\w\s+#%&@*/=<>^$~|]'
+                         r'(?:(?<=[^.-])|(?<=\w-)|(?<=[.-])(?!\d))',
+                         re.UNICODE)
+NON_ASCII = re.compile(r'[^\x00-\x7f]')
+
+# A normalised answer that is a number, which must always match exactly
+NUMBER = re.compile(r'[\d\s.,%+-]*\d[\d\s.,%+-]*$')
+
+# Answers shorter than this must always match exactly
+MIN_FUZZY_LENGTH = 4
+
+# Marks the start of an answer, so that short prefixes have trigrams too
+START = '\0\0'
+
+
+def normalize(text):
+    """ Return the normalised form of 'text' for comparing answers
+
+        Text that is all punctuation (eg '?') is kept as it is, apart from
+        the case and whitespace, rather than normalised to nothing.
+    """
+
+    if NON_ASCII.search(text) != None: # Most answers need no decomposing
+        text = unicodedata.normalize('NFKD', text)
+        text = "".join(char for char in text
+                       if not unicodedata.combining(char))
+        text = text.replace(u'\u2212', '-') # A minus sign
+    text = " ".join(text.lower().split())
+    normalized = " ".join(PUNCTUATION.sub(' ', text).split())
+    if normalized == "":
+        return text
+    return normalized
+
+
+def edit_distance(first, second, limit):
+    """ Return the edit distance between two strings, up to limit + 1
+
+        Insertions, deletions, substitutions and swapping two neighbouring
+        characters each count as one edit. The distance is computed a row at
+        a time, stopping as soon as it must be over the limit.
+    """
+
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+
+    before = None
+    previous = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        current = [i]
+        for j in range(1, len(second) + 1):
+            cost = first[i - 1] != second[j - 1]
+            distance = min(previous[j] + 1, current[j - 1] + 1,
+                           previous[j - 1] + cost)
+            if i > 1 and j > 1 and first[i - 1] == second[j - 2] and \
+                    first[i - 2] == second[j - 1]:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > limit and min(previous) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class AnswerMatcher(object):
+    """ Decides whether a given answer matches the correct answer """
+
+    def __init__(self, tolerance=0):
+        """ Initialise the matcher, allowing 'tolerance' typos per answer """
+
+        self.tolerance = tolerance
+
+
+    def matches(self, normalized, answer, fuzzy=True):
+        """ Return True if 'answer' matches the normalised correct answer
+
+            Typos are only allowed if 'fuzzy' is True and the correct answer
+            is long enough (and not a number), so that eg '30' never matches
+            '50'. An empty answer never matches.
+        """
+
+        answer = normalize(answer)
+        if answer == "":
+            return False
+        if answer == normalized:
+            return True
+        if not fuzzy or self.tolerance == 0 or \
+                len(normalized) < MIN_FUZZY_LENGTH or \
+                NUMBER.match(normalized) != None:
+            return False
+        return edit_distance(normalized, answer,
+                             self.tolerance) <= self.tolerance
+
+
+def trigrams(text):
+    """ Return the set of trigrams of the normalised text, with a start
+        mark
+    """
+
+    text = START + text
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class CompletionIndex(object):
+    """ A trigram index over a set of answers, for prefix completion """
+
+    def __init__(self, answers):
+        """ Build the index over the (unique) 'answers' """
+
+        self.answers = sorted(set(answers))
+        self.normalized = [normalize(answer) for answer in self.answers]
+        self.index = {} # Trigram: set of answer ids
+        for answer_id, text in enumerate(self.normalized):
+            for trigram in trigrams(text):
+                self.index.setdefault(trigram, set()).add(answer_id)
+
+
+    def complete(self, prefix, limit=20):
+        """ Return up to 'limit' answers starting with 'prefix'
+
+            Candidates are the answers sharing every trigram of the prefix;
+            only those are checked, rather than every answer.
+        """
+
+        prefix = normalize(prefix)
+        candidates = None
+        for trigram in sorted(trigrams(prefix),
+                              key=lambda trigram: len(self.index.get(trigram,
+                                                                     ()))):
+            ids = self.index.get(trigram, set())
+            candidates = ids if candidates == None else candidates & ids
+            if len(candidates) == 0:
+                return []
+
+        if candidates == None: # An empty prefix
+            candidates = range(len(self.answers))
+        matches = [self.answers[answer_id] for answer_id in sorted(candidates)
+                   if self.normalized[answer_id].startswith(prefix)]
+        return matches[:limit]
@@ -5,12 +5,324 @@
 
 """
 
-from random import randint
+from array import array
+from copy import copy
 
+import hashlib
+import os
 import sys
+import time
+from random import shuffle
 if sys.version_info.major < 3:
     FileNotFoundError = IOError
 
+numpy = None # Imported when first needed (see load_numpy), as it is slow
+
+import quizcache
+from quizsearch import SearchIndex
+from answermatch import AnswerMatcher, CompletionIndex, normalize
+from scheduler import SCHEDULERS
+
+VERSION = 0.1
+
+# Length of the hashed question ids, in hex digits
+ID_LENGTH = 12
+
+
+def load_numpy():
+    """ Return the numpy module, or None if it is not available """
+
+    global numpy
+    if numpy == None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+    return numpy or None
+
+
+def read_lines(quiz):
+    """ Yield (line number, line) for each meaningful line in 'quiz'
+
+        Blank lines and comments are skipped, and lines ending in a
+        backslash are joined onto the following line. Line numbers start at
+        one and refer to the first physical line of a continued line.
+    """
+
+    continued = None
+    for line_num, line in enumerate(quiz, 1):
+        line = line.rstrip('\r\n')
+
+        if continued != None:
+            start_num, start = continued
+            line = start + ' ' + line.strip()
+        elif len(line.strip()) == 0 or line[0] == '#':
+            continue
+        else:
+            start_num = line_num
+
+        if line.endswith('\\'):
+            continued = (start_num, line[:-1].rstrip())
+        else:
+            continued = None
+            yield start_num, line
+
+    if continued != None:
+        yield continued
+
+
+def hash_id(question, answer):
+    """ Return the default id for a question: a hash of it's text and
+        answer, ignoring case and spacing, so that it stays the same as the
+        rest of the quiz is edited
+    """
+
+    text = " ".join(question.lower().split()) + '\n' + \
+           " ".join(answer.lower().split())
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:ID_LENGTH]
+
+
+def check_question(question, line_num, errors):
+    """ Check that a parsed question is valid
+
+        Problems are appended to 'errors'; returns True if there were none.
+    """
+
+    if question.sort == 'multichoice' and \
+            question.answer not in question.choices:
+        errors.append((line_num, "answer '{}' is not one of the choices"
+                                 .format(question.answer)))
+        return False
+    return True
+
+
+def assign_id(question, explicit, line_num, ids, errors):
+    """ Give a parsed question an id that is unique among the set 'ids'
+
+        Questions without an explicit id get the default (hashed) id. A
+        repeated explicit id is appended to 'errors' (returning False),
+        while a repeated hashed id (a repeated question) gets a numbered
+        suffix. The id is then added to 'ids'.
+    """
+
+    if not explicit:
+        question.id = hash_id(question.question, question.answer)
+    question_id = question.id
+    if question_id in ids:
+        if explicit:
+            errors.append((line_num, "duplicate question id '{}'"
+                                     .format(question_id)))
+            return False
+        number = 2
+        while "{}-{}".format(question_id, number) in ids:
+            number += 1
+        question_id = question.id = "{}-{}".format(question_id, number)
+    ids.add(question_id)
+    return True
+
+
+def add_choices(question, choices, line_num, errors):
+    """ Add 'choices' to the (unshared) choices of 'question'
+
+        Duplicate choice titles are appended to 'errors' instead.
+    """
+
+    for choice_id, choice in choices.items():
+        if choice_id in question.choices:
+            errors.append((line_num, "duplicate choice title '{}'"
+                                     .format(choice_id)))
+        else:
+            question.choices[choice_id] = choice
+
+
+class ParsedQuestion(object):
+    """ A question as it is parsed, before it is added to a QuestionTable
+
+        This is a plain record, so that parsing does not build a table for
+        every question.
+    """
+
+    __slots__ = ('id', 'question', 'answer', 'sort', 'choices')
+
+
+    def __init__(self, question, answer):
+        """ Initialise a prompt question, with no id yet """
+
+        self.id = None
+        self.question = question
+        self.answer = answer
+        self.sort = 'prompt'
+        self.choices = None
+
+
+def parse_questions(quiz, errors, line_nums=None, choice_sets=None,
+                    ids=None):
+    """ Yield the questions in the file object 'quiz', in a single pass
+
+        Syntax errors do not stop the parse; instead, (line number, message)
+        pairs are appended to 'errors' and the offending questions or lines
+        are skipped. If 'line_nums' is given, the line number of each
+        question is appended to it as the question is yielded.
+
+        Named choice sets defined in the quiz are added to the dict
+        'choice_sets' (if given), which may also hold sets defined elsewhere.
+        Every question using a set shares the same choices dict.
+
+        Question ids are kept unique among the set 'ids' (if given), which
+        the ids of the parsed questions are added to.
+    """
+
+    if choice_sets == None:
+        choice_sets = {}
+    if ids == None:
+        ids = set()
+
+    current_question = None
+    question_line = None # Line number of the current question
+    shared = False # The current question's choices are a shared set
+    explicit = False # The current question has an explicit id
+    current_set = None # Choices of the choice set being defined
+    skipping = False # Skipping the choices of an invalid question
+
+    for line_num, line in read_lines(quiz):
+        if not line[0].isspace():
+            # Save the old question
+            if current_question != None:
+                if check_question(current_question, question_line, errors) \
+                        and assign_id(current_question, explicit,
+                                      question_line, ids, errors):
+                    if line_nums != None:
+                        line_nums.append(question_line)
+                    yield current_question
+                current_question = None
+            if current_set == {}:
+                errors.append((set_line, "choice set has no choices"))
+            current_set = None
+
+            if line[0] == '@' and ':' not in line:
+                # Start a new choice set
+                name = line[1:].strip()
+                skipping = True
+                if name == "" or len(name.split()) != 1:
+                    errors.append((line_num, "expected a choice set name " +
+                                             "(@name)"))
+                elif name in choice_sets:
+                    errors.append((line_num, "choice set '{}' is already "
+                                             "defined".format(name)))
+                else:
+                    current_set = choice_sets[name] = {}
+                    set_line = line_num
+                    skipping = False
+                continue
+
+            # Set the new question and answer
+            if line.count(':') != 1: # Not a valid line!
+                errors.append((line_num, "expected a new question " +
+                                         "(question: answer)"))
+                skipping = True
+                continue
+
+            question, answer = line.split(':')
+            current_question = ParsedQuestion(question.strip(),
+                                              answer.strip())
+            question_line = line_num
+            shared = False
+            explicit = False
+            skipping = False
+
+        elif current_set != None:
+            # On a choice set
+            choice_id, colon, value = line.partition(':')
+            choice_id = choice_id.strip()
+            if colon == '':
+                errors.append((line_num, "expected a choice " +
+                                         "(choice title: choice)"))
+            elif choice_id in current_set:
+                errors.append((line_num, "duplicate choice title '{}'"
+                                         .format(choice_id)))
+            else:
+                current_set[choice_id] = value.strip()
+
+        elif current_question != None:
+            # On an older question
+            if line.lstrip()[0] == '[' and ':' not in line:
+                # Set the question's id
+                question_id = line.strip()[1:-1]
+                if not line.rstrip().endswith(']') or \
+                        len(question_id.split()) != 1 or \
+                        '[' in question_id or ']' in question_id:
+                    errors.append((line_num, "expected a question id " +
+                                             "([id])"))
+                elif explicit:
+                    errors.append((line_num, "question already has an id"))
+                else:
+                    current_question.id = question_id
+                    explicit = True
+                continue
+
+            # Must be multichoice
+            if line.lstrip()[0] == '@' and ':' not in line:
+                # Use a choice set
+                name = line.strip()[1:]
+                if name not in choice_sets:
+                    errors.append((line_num, "unknown choice set '{}'"
+                                             .format(name)))
+                elif current_question.sort != 'multichoice':
+                    # Share the set, rather than copying it
+                    current_question.sort = 'multichoice'
+                    current_question.choices = choice_sets[name]
+                    shared = True
+                else:
+                    if shared:
+                        current_question.choices = \
+                                dict(current_question.choices)
+                        shared = False
+                    add_choices(current_question, choice_sets[name],
+                                line_num, errors)
+                continue
+
+            choice_id, colon, value = line.partition(':')
+            if colon == '':
+                errors.append((line_num, "expected a choice " +
+                                         "(choice title: choice)"))
+                continue
+
+            if current_question.sort != 'multichoice':
+                current_question.sort = 'multichoice'
+                current_question.choices = {}
+            elif shared:
+                current_question.choices = dict(current_question.choices)
+                shared = False
+
+            # Get the added choice
+            choice_id = choice_id.strip()
+            if choice_id in current_question.choices:
+                errors.append((line_num, "duplicate choice title '{}'"
+                                         .format(choice_id)))
+                continue
+            current_question.choices[choice_id] = value.strip()
+
+        elif not skipping:
+            errors.append((line_num, "indented line before the start of " +
+                                     "a question"))
+
+    if current_question != None:
+        # Add in the last question
+        if check_question(current_question, question_line, errors) and \
+                assign_id(current_question, explicit, question_line, ids,
+                          errors):
+            if line_nums != None:
+                line_nums.append(question_line)
+            yield current_question
+    if current_set == {}:
+        errors.append((set_line, "choice set has no choices"))
+
+
+def question_weight(correct, wrong, total_question):
+    """ Return the weight of a question with the given stats """
+
+    return 1 + (wrong - (correct / 2))
+
 
 class Quiz(object):
     """ A quiz
@@ -25,131 +337,675 @@ class Quiz(object):
             [<choice title>: <choice>]
             [...]
 
+        A line ending in a backslash is continued on the next line.
+
+        Choices used by many questions can be defined once as a named set,
+        and used in place of (or as well as) a question's own choices:
+
+        @<set name>
+            <choice title>: <choice>
+            [...]
+
+        <actual question>: <answer>
+            @<set name>
+
+        Each question has an id, used to keep track of it's stats as the
+        quiz is edited. By default this is a hash of the question and
+        answer, but a question can be given an id of it's own:
+
+        <actual question>: <answer>
+            [<id>]
+
     """
 
-    def __init__(self, quiz_file):
-        """ Initialise self using quiz_file, and load the quiz """
+    def __init__(self, quiz_file, cache=True, stats=None,
+                 scheduler='weighted', tolerance=0, lazy=False,
+                 lazy_cache=1024):
+        """ Initialise self using quiz_file, and load the quiz
+
+            If cache is True, the parsed quiz is loaded from (or saved to) a
+            compiled cache alongside the quiz file. If a StatsStore is given
+            as 'stats', question stats are loaded from it on the first draw
+            and saved to it as answers are recorded. 'scheduler' names the
+            scheduler (see scheduler.SCHEDULERS) used to pick questions, and
+            'tolerance' is the number of typos allowed in prompt answers.
+
+            If 'lazy' is True, the quiz file is memory mapped and questions
+            are only parsed when first needed, keeping at most 'lazy_cache'
+            parsed questions (see lazyquiz); the compiled cache is not used.
+            Syntax errors are then only found when a question is parsed.
+        """
+
+        if scheduler not in SCHEDULERS:
+            raise QuizException("Unknown scheduler '{}'!".format(scheduler))
 
         self.total_questions = 0
+        self.scheduler = scheduler
+        self._scheduler = None # Built on the first draw
+
+        self.name = os.path.abspath(quiz_file)
+        self.stats = stats
+        self._stats_loaded = stats == None
+
+        self.active = None # Positions of the questions to ask, or None for all
+        self.skipped = [] # Errors from questions that could not be read
+        self.matcher = AnswerMatcher(tolerance)
+        self._completions = None # Completion index, built when needed
+        self._search = None # Search index, built or loaded when needed
+        self._ids = None # Question id: position, built when needed
+
+        if not os.path.isfile(quiz_file):
+            raise QuizException("Quiz file '{}' not found!".format(quiz_file))
+        stat = os.stat(quiz_file)
+        self.loaded_stat = (stat.st_size, stat.st_mtime) # Of the file loaded
+
+        cached = None
+        self._cache_digest = None # Hash of the quiz the cache was built from
+        if lazy:
+            from lazyquiz import LazyQuestionTable
+            self.questions = LazyQuestionTable(quiz_file, lazy_cache)
+            if len(self.questions) == 0:
+                raise QuizException("Quiz file '{}' has no questions!".format(
+                                                                   quiz_file))
+            return
+
+        if cache:
+            cached = quizcache.read_cache(quiz_file)
+
+        if cached != None:
+            self._cache_digest, columns = cached
+            self.questions = QuestionTable.from_columns(columns)
+        else:
+            header = quizcache.make_header(quiz_file) if cache else None
+            self.questions = self.parse(quiz_file)
+            self.questions.strings = {} # Only needed while loading
+            self.questions.choice_sets = {}
+
+        if len(self.questions) == 0:
+            raise QuizException("Quiz file '{}' has no questions!".format(
+                                                                   quiz_file))
+
+        if cache and cached == None:
+            # Build the search index up front, so that it is cached too
+            self._search = SearchIndex.build(self.questions)
+            if quizcache.write_cache(quiz_file,
+                                     [('questions', self.questions.columns()),
+                                      ('search', self._search.data())],
+                                     header):
+                self._cache_digest = header['hash']
+
+
+    @staticmethod
+    def parse(quiz_file):
+        """ Parse quiz_file, returning a QuestionTable of it's questions """
 
         try:
             quiz = open(quiz_file)
         except FileNotFoundError:
             raise QuizException("Quiz file '{}' not found!".format(quiz_file))
-        
-        # Parse the file...
-
-        # Get the lines and close the file
-        lines = quiz.readlines()
-        quiz.close()
-
-        # Convert lines to a dict in format line number: line
-        quiz_lines = {}
-        for index, line in enumerate(lines):
-            # Ignore blank lines and commented lines
-            #TODO: Add support for continued lines
-            if len(line.strip()) != 0 and line[0] != '#':
-                quiz_lines[index] = line
-
-        # Questions!
-        self.questions = []
-        current_question = None
-
-        for line_num in quiz_lines:
-            line = quiz_lines[line_num]
-            if line[:4] != '    ':
-                #TODO: Check question for validity
-                    
-                # Save the old question
-                if current_question != None:
-                    self.questions.append(current_question)
-
-                # Set the new question and answer
-                if line.count(':') != 1: # Not a valid line!
-                    raise QuizException("Line {} is not a valid line -".format(
-                                                                    line_num) + 
-                                        " expected a new question " + 
-                                        "(question: answer)!")
-
-                question, answer = line.split(':')
-                current_question = Question(question.strip(), answer.strip())
-
-            elif current_question != None:
-                # On an older question
-                # Must be multichoice
-                if current_question.sort != 'multichoice':
-                    current_question.sort = 'multichoice'
-                    current_question.choices = {}
 
-                # Get the added choice
-                choice_id, value = line.split(':')
-                current_question.choices[choice_id.strip()] = value.strip()
+        # Parse the file, one line at a time
+        table = QuestionTable()
+        errors = []
+        with quiz:
+            for question in parse_questions(quiz, errors):
+                table.append(question.question, question.answer,
+                             question.sort, question.choices,
+                             question_id=question.id)
+
+        if len(errors) != 0:
+            errors.sort()
+            raise QuizException("Quiz file '{}' has {} error(s)".format(
+                                                    quiz_file, len(errors)),
+                                errors)
+        return table
+
+
+    def add_question(self, question):
+        """ Add a copy of 'question' to the end of the quiz
+
+            Returns the added question.
+        """
+
+        position = self.questions.append(question.question, question.answer,
+                                         question.sort, question.choices,
+                                         question.correct, question.wrong,
+                                         question.id)
+        self._ids = None
+        return self.questions[position]
+
+
+    def is_cached(self):
+        """ Return True if the quiz is saved in a fresh compiled cache """
+
+        return self._cache_digest != None
+
+
+    def clone(self):
+        """ Return a copy of the quiz with fresh stats
+
+            The copy shares the (read only) question text and choices with
+            this quiz, but has its own stats and scheduler, and does not save
+            its stats anywhere.
+        """
+
+        quiz = copy(self)
+        quiz.total_questions = 0
+        quiz.stats = None
+        quiz._stats_loaded = True
+        quiz._scheduler = None
+        quiz.questions = self.questions.clone()
+        return quiz
+
+
+    def by_id(self, question_id):
+        """ Return the question with the id 'question_id'
+
+            Raises a KeyError if there is no such question. The lookup table
+            is built on the first call; for a lazily loaded quiz, this
+            parses every question.
+        """
+
+        if self._ids == None:
+            self._ids = dict((question_id, position)
+                             for position, question_id
+                             in enumerate(self.questions.ids))
+        return self.questions[self._ids[question_id]]
+
+
+    def search(self, query):
+        """ Return the positions of the questions matching 'query'
+
+            A question matches if every word in the query appears in the
+            question or it's choices.
+        """
 
+        if self._search == None:
+            cached = None
+            if self._cache_digest != None:
+                cached = quizcache.read_cache(self.name, 'search',
+                                              self._cache_digest)
+            if cached != None:
+                self._search = SearchIndex.from_data(cached[1])
             else:
-                raise QuizException("Indented line before the start of " +
-                                    " a question!")
+                self._search = SearchIndex.build(self.readable_questions())
+        return self._search.search(query)
+
+
+    def readable_questions(self):
+        """ Yield the questions that can be read
+
+            Questions that cannot be read (in a lazily loaded quiz) are left
+            out, and their errors added to self.skipped.
+        """
+
+        for position in range(len(self.questions)):
+            try:
+                if self.questions.load_row(position):
+                    self.update_question(position)
+            except QuizException as error:
+                self.skipped.append(error)
+            else:
+                yield self.questions[position]
+
+
+    def check_answer(self, question, answer):
+        """ Return True if 'answer' is a correct answer to 'question' """
+
+        return self.matcher.matches(question.normalized, answer,
+                                    question.sort == 'prompt')
+
+
+    def complete(self, prefix, limit=20):
+        """ Return up to 'limit' prompt answers starting with 'prefix' """
+
+        if self._completions == None:
+            self._completions = CompletionIndex(
+                                    question.answer
+                                    for question in self.questions
+                                    if question.sort == 'prompt')
+        return self._completions.complete(prefix, limit)
 
-        if current_question != None:
-            self.questions.append(current_question) # Add in the last question
-        else:
-            raise QuizException("Quiz file '{}' has no questions!".format(
-                                                                   quiz_file))
+
+    def restrict(self, positions):
+        """ Only ask the questions at 'positions' (or all, if None) """
+
+        if positions != None and len(positions) == 0:
+            raise QuizException("No questions to ask!")
+        self.active = positions
+        self._scheduler = None
 
 
     def get_question(self):
-        """ Return a randomly selected question
-            TODO: Add semi-random selection...
+        """ Return the next question, as chosen by the scheduler
+
+            A question that cannot be read (in a lazily loaded quiz) is
+            skipped; see skip_question.
         """
 
         self.total_questions += 1
 
-        # Calculate the total weight
-        total_weight = 0
-        for question in self.questions:
-            total_weight += question.weight(self.total_questions)
-        
-        rand_value = randint(0, int(total_weight))
-
-        combined_weight = 0
-        for question in self.questions:
-            weight = question.weight(self.total_questions)
-            combined_weight += weight
-            if rand_value <= combined_weight:
-                return question
+        if not self._stats_loaded:
+            self.load_stats()
+
+        while True:
+            if self._scheduler == None:
+                self._scheduler = SCHEDULERS[self.scheduler](self)
+
+            position = self._scheduler.next_question()
+            try:
+                if self.questions.load_row(position):
+                    # Saved stats were given to the row as it was decoded
+                    self.update_question(position)
+            except QuizException as error:
+                self.skip_question(position, error)
             else:
-                combined_weight += weight
+                return self.questions[position]
+
+
+    def skip_question(self, position, error):
+        """ Stop asking the question at 'position', which could not be read
+
+            The error is added to self.skipped, for the interface to report.
+            Raises a QuizException if there are no questions left to ask.
+        """
+
+        self.skipped.append(error)
+        positions = self.active
+        if positions == None:
+            positions = range(len(self.questions))
+        self.restrict([other for other in positions if other != position])
+
+
+    def load_stats(self):
+        """ Load the saved stats for each question from the stats store """
+
+        self.questions.load_stats(self.stats.load(self.name))
+        self._stats_loaded = True
+        self._scheduler = None # The stats have changed
+
+
+    def record_answer(self, question, correct):
+        """ Record an answer to 'question', updating the question stats """
+
+        if correct:
+            question.correct += 1
+        else:
+            question.wrong += 1
+        self.update_question(question.position)
+
+        if self.stats != None:
+            self.stats.record(self.name, question.key, question.correct,
+                              question.wrong)
+
+
+    def update_question(self, position):
+        """ Update the scheduling of the question at 'position'
+
+            This must be called whenever the stats of a question change.
+        """
+
+        if self._scheduler != None:
+            self._scheduler.update(position)
 
 
 class QuizException(Exception):
-    """ Exception to be raised when an error occurs while parsing a quiz """
+    """ Exception to be raised when an error occurs while parsing a quiz
+
+        'errors' is a list of (line number, message) pairs, one for each
+        syntax error found in the quiz file.
+    """
+
+    def __init__(self, message, errors=()):
+        """ Initialise the exception """
+
+        Exception.__init__(self, message)
+        self.errors = list(errors)
+
+
+    def __str__(self):
+        """ Return the message, followed by any syntax errors """
+
+        lines = [Exception.__str__(self)]
+        for line_num, error in self.errors:
+            lines.append("line {}: {}".format(line_num, error))
+        return "\n".join(lines)
+
+
+class QuestionTable(object):
+    """ Compact, column based storage for the questions of a quiz
+
+        Each question is a row; the text columns are Python lists of
+        interned strings (so repeated answers and choices are stored once),
+        and the stats are machine integer arrays. Identical choices are
+        interned too, so questions with the same choices share one dict.
+        Indexing the table returns a lightweight Question view of a row.
+    """
+
+    def __init__(self):
+        """ Initialise an empty table """
+
+        self.strings = {} # Interned strings
+        self.choice_sets = {} # Interned choices, keyed by a frozenset
+        self.sorts = [] # Sort names, indexed by sort code
 
-    pass
+        self.ids = []
+        self.texts = []
+        self.answers = []
+        self.normalized = [] # Normalised answers, for matching
+        self.sort_codes = array('b')
+        self.choices = []
+        self.correct = array('q')
+        self.wrong = array('q')
+
+
+    def intern(self, string):
+        """ Return the shared copy of 'string' """
+
+        return self.strings.setdefault(string, string)
+
+
+    def sort_code(self, sort):
+        """ Return the code for the question sort 'sort' """
+
+        if sort not in self.sorts:
+            self.sorts.append(sort)
+        return self.sorts.index(sort)
+
+
+    def intern_choices(self, choices):
+        """ Return the shared copy of 'choices', with it's strings interned
+
+            The returned dict is shared, so it must never be changed.
+        """
+
+        if choices == None:
+            return None
+        key = frozenset(choices.items())
+        if key not in self.choice_sets:
+            self.choice_sets[key] = dict((self.intern(choice_id),
+                                          self.intern(choice))
+                                         for choice_id, choice
+                                         in choices.items())
+        return self.choice_sets[key]
+
+
+    def append(self, question, answer, sort='prompt', choices=None,
+               correct=0, wrong=0, question_id=None):
+        """ Add a new row, returning it's position
+
+            If no 'question_id' is given, the default (hashed) id is used.
+        """
+
+        if question_id == None:
+            question_id = hash_id(question, answer)
+        self.ids.append(question_id)
+        self.texts.append(question) # Question text is rarely repeated
+        self.answers.append(self.intern(answer))
+        self.normalized.append(self.intern(normalize(answer)))
+        self.sort_codes.append(self.sort_code(sort))
+        self.choices.append(self.intern_choices(choices))
+        self.correct.append(correct)
+        self.wrong.append(wrong)
+        return len(self.texts) - 1
+
+
+    def set_row(self, position, question, answer, sort='prompt', choices=None,
+                correct=0, wrong=0, question_id=None):
+        """ Replace the row at 'position' """
+
+        if question_id == None:
+            question_id = hash_id(question, answer)
+        self.ids[position] = question_id
+        self.texts[position] = question
+        self.answers[position] = self.intern(answer)
+        self.normalized[position] = self.intern(normalize(answer))
+        self.sort_codes[position] = self.sort_code(sort)
+        self.choices[position] = self.intern_choices(choices)
+        self.correct[position] = correct
+        self.wrong[position] = wrong
+
+
+    def remove(self, position):
+        """ Remove the row at 'position', moving the last row into it's place
+
+            Returns the old position of the moved row (which is 'position'
+            itself if the last row was removed).
+        """
+
+        last = len(self.texts) - 1
+        for column in (self.ids, self.texts, self.answers, self.normalized,
+                       self.sort_codes, self.choices, self.correct,
+                       self.wrong):
+            column[position] = column[last]
+            column.pop()
+        return last
+
+
+    # Columns saved in the compiled cache, with the sort names
+    COLUMNS = ('ids', 'texts', 'answers', 'normalized', 'sort_codes',
+               'choices')
+
+
+    def columns(self):
+        """ Return the columns (but not the stats) as a dict, for caching
+
+            Shared strings and choices stay shared when the dict is saved
+            with marshal.
+        """
+
+        columns = dict((name, getattr(self, name)) for name in self.COLUMNS)
+        columns['sort_codes'] = self.sort_codes.tobytes()
+        columns['sorts'] = self.sorts
+        return columns
+
+
+    @classmethod
+    def from_columns(cls, columns):
+        """ Return a table with the given columns (see columns), and fresh
+            stats
+        """
+
+        table = cls()
+        for name in cls.COLUMNS:
+            setattr(table, name, columns[name])
+        table.sort_codes = array('b')
+        table.sort_codes.frombytes(columns['sort_codes'])
+        table.sorts = columns['sorts']
+        table.correct = array('q', [0]) * len(table.texts)
+        table.wrong = array('q', [0]) * len(table.texts)
+        return table
+
+
+    def load_row(self, position):
+        """ Make sure that the row at 'position' can be read
+
+            Returns True if the stats of the row changed as it was loaded
+            (so the scheduler must be updated).
+            Rows are always loaded here, but a LazyQuestionTable raises a
+            QuizException if the question has a syntax error.
+        """
+
+        return False
+
+
+    def load_stats(self, saved):
+        """ Set the stats of each row from 'saved', a dict of question id:
+            (correct, wrong)
+        """
+
+        correct = self.correct
+        wrong = self.wrong
+        for position, question_id in enumerate(self.ids):
+            if question_id in saved:
+                correct[position], wrong[position] = saved[question_id]
+
+
+    def clone(self):
+        """ Return a table sharing the text columns, with fresh stats """
+
+        table = copy(self)
+        table.correct = array('q', [0]) * len(self.correct)
+        table.wrong = array('q', [0]) * len(self.wrong)
+        return table
+
+
+    def weights(self, total_question):
+        """ Return a list of the weights of every question
+
+            With numpy available, this is a single vectorised operation over
+            the stats columns.
+        """
+
+        numpy = load_numpy()
+        if numpy != None:
+            return question_weight(numpy.frombuffer(self.correct, 'int64'),
+                                   numpy.frombuffer(self.wrong, 'int64'),
+                                   total_question).tolist()
+        return [question_weight(correct, wrong, total_question)
+                for correct, wrong in zip(self.correct, self.wrong)]
+
+
+    def __len__(self):
+        """ Return the number of questions """
+
+        return len(self.texts)
+
+
+    def __getitem__(self, position):
+        """ Return a view of the question at 'position' """
+
+        if position < 0:
+            position += len(self.texts)
+        if not 0 <= position < len(self.texts):
+            raise IndexError("Question {} out of range".format(position))
+        return Question.view(self, position)
+
+
+    def __iter__(self):
+        """ Iterate over views of each question """
+
+        for position in range(len(self.texts)):
+            yield Question.view(self, position)
+
+
+def column_property(column, doc, intern=False):
+    """ Return a property accessing 'column' of a Question's table """
+
+    def get(question):
+        return getattr(question.table, column)[question.position]
+
+    def set(question, value):
+        if intern:
+            value = question.table.intern(value)
+        getattr(question.table, column)[question.position] = value
+
+    return property(get, set, doc=doc)
 
 
 class Question(object):
     """ A question class
         
         This will be generated by the quizzer
+
+        Questions are views of a row in a QuestionTable; a question created
+        directly gets a table of it's own.
     """
 
-    def __init__(self, question, answer, sort='prompt'):
+    __slots__ = ('table', 'position')
+
+
+    def __init__(self, question, answer, sort='prompt', choices=None):
         """ Initialise the Question """
 
-        self.question = question
-        self.answer = answer
-        self.sort = sort
+        self.table = QuestionTable()
+        self.position = self.table.append(question, answer, sort, choices)
 
-        self.choices = None
 
-        # Stats for this question...
-        self.wrong = 0
-        self.correct = 0
+    @classmethod
+    def view(cls, table, position):
+        """ Return a view of the question at 'position' in 'table' """
+
+        question = cls.__new__(cls)
+        question.table = table
+        question.position = position
+        return question
+
+
+    def __eq__(self, other):
+        """ Return True if 'other' views the same question """
+
+        return isinstance(other, Question) and self.table is other.table \
+               and self.position == other.position
+
+
+    def __ne__(self, other):
+        """ Return True if 'other' views a different question """
+
+        return not self == other
+
+
+    def __hash__(self):
+        """ Return a hash of the viewed question """
+
+        return hash((id(self.table), self.position))
+
+
+    id = column_property('ids', "The id of the question")
+    question = column_property('texts', "The question text")
+    normalized = column_property('normalized', "The normalised answer", True)
+    choices = column_property('choices', "The choices, if multichoice")
+
+    # Stats for this question...
+    correct = column_property('correct', "Number of correct answers")
+    wrong = column_property('wrong', "Number of wrong answers")
+
+
+    @property
+    def answer(self):
+        """ Return the answer """
+
+        return self.table.answers[self.position]
+
+
+    @answer.setter
+    def answer(self, value):
+        """ Set the answer, and it's normalised form """
+
+        self.table.answers[self.position] = self.table.intern(value)
+        self.table.normalized[self.position] = \
+                self.table.intern(normalize(value))
+
+
+    @property
+    def sort(self):
+        """ Return the sort of question """
+
+        return self.table.sorts[self.table.sort_codes[self.position]]
+
+
+    @sort.setter
+    def sort(self, value):
+        """ Set the sort of question """
+
+        self.table.sort_codes[self.position] = self.table.sort_code(value)
+
+
+    @property
+    def key(self):
+        """ Return a key identifying this question within its quiz
+
+            This is the question's id, which (unlike it's position) stays
+            the same as the quiz is edited.
+        """
+
+        return self.id
 
 
     def weight(self, total_question):
         """ Return an integer value - the weight of the current question """
 
-        return 1 + (self.wrong - (self.correct / 2))
+        return question_weight(self.correct, self.wrong, total_question)
 
 
 
@@ -173,18 +1029,59 @@ class BaseQuiz(object):
         pass
 
 
-    def __init__(self, quiz=None):
-        """ Initialise self """
+    def __init__(self, quiz=None, stats=None, scheduler='weighted',
+                 library=None, question_filter=None, tolerance=0,
+                 lazy=False, checkpoint=None, resume=False, events=None,
+                 watch=None, exam=None, seed=None):
+        """ Initialise self
+
+            'stats' is an optional StatsStore used to persist question stats,
+            'scheduler' names the scheduler used to pick questions, and
+            'library' is an optional QuizLibrary to load quizzes from by name.
+            If 'question_filter' is given, only questions matching that
+            search query are asked. 'tolerance' is the number of typos
+            allowed in answers to prompt questions. If 'lazy' is True,
+            quizzes are parsed lazily (see Quiz).
+
+            If a Checkpoint is given as 'checkpoint', the session is saved to
+            it as it goes; if 'resume' is also True, the session saved there
+            (if any) is restored instead of opening 'quiz'. If an EventLog
+            is given as 'events', every answer is recorded in it.
+
+            If 'watch' is given, the quiz file is checked for changes at most
+            every 'watch' seconds, and reloaded (keeping the stats) when it
+            has changed.
+
+            If 'exam' is given, each quiz is an exam of that many distinct
+            questions, drawn from 'seed' (see exam.ExamPaper); the quiz is
+            not reloaded during an exam.
+        """
 
         # Set the initial quiz state
         self.running = True
-        if quiz != None:
-            self.quiz = Quiz(quiz)
-        else:
-            self.quiz = None
+        self.stats = stats
+        self.scheduler = scheduler
+        self.library = library
+        self.question_filter = question_filter
+        self.tolerance = tolerance
+        self.lazy = lazy
+        self.checkpoint = checkpoint
+        self.events = events
+        self.watch = watch
+        self.reloader = None # QuizReloader for the current quiz, if watching
+        self.last_poll = 0
+        self.exam = exam
+        self.seed = seed
+        self.paper = None # ExamPaper for the current quiz, in an exam
 
+        self.quiz = None
         self._answer = None
         self.question = None
+        self.asked_at = None # When the current question was shown
+        if checkpoint != None and resume:
+            self.resume()
+        if quiz != None and self.quiz == None:
+            self.quiz = self.open_quiz(quiz)
 
 
     def __str__(self):
@@ -233,6 +1130,12 @@ class BaseQuiz(object):
 
         self.running = False
         self.quiz = None
+        if self.stats != None:
+            self.stats.flush()
+        if self.checkpoint != None:
+            self.checkpoint.flush()
+        if self.events != None:
+            self.events.flush()
 
 
     def cancel_quiz(self):
@@ -242,6 +1145,14 @@ class BaseQuiz(object):
             self.quit()
         else:
             self.quiz = None
+            self.question = None
+            self.paper = None
+            if self.stats != None:
+                self.stats.flush()
+            if self.checkpoint != None:
+                self.checkpoint.flush()
+            if self.events != None:
+                self.events.flush()
             self.new_quiz()
 
 
@@ -252,7 +1163,10 @@ class BaseQuiz(object):
             self.load_quiz()
         
         if self.quiz != None: # If a quiz was loaded
-            self.next_question()
+            if self.question == None:
+                self.next_question()
+            else:
+                self.display_question() # Resumed part way through
 
 
     def next_question(self):
@@ -264,7 +1178,18 @@ class BaseQuiz(object):
         self.question = None
         self.answer = None
 
-        self.question = self.quiz.get_question()
+        self.check_reload()
+        try:
+            self.question = self.draw_question()
+        except QuizException as error:
+            # Nothing left that can be asked
+            self.report_skipped(str(error))
+            self.cancel_quiz()
+            return
+        if self.question == None:
+            self.exam_finished()
+            return
+        self.question_asked()
         self.display_question()
 
 
@@ -277,15 +1202,166 @@ class BaseQuiz(object):
         else:
             correct_answer = self.question.answer
 
-        correct = self.question.answer == self.answer
-        if correct:
-            self.question.correct += 1
-        else:
-            self.question.wrong += 1
+        answer = self.answer
+        correct = self.quiz.check_answer(self.question, answer)
+        self.quiz.record_answer(self.question, correct)
+        if self.paper != None and correct:
+            self.paper.correct += 1
+        if self.checkpoint != None:
+            self.checkpoint.record_answer(self.quiz, self.question,
+                                          self.paper)
+        if self.events != None:
+            latency = None
+            if self.asked_at != None:
+                latency = time.time() - self.asked_at
+            self.events.record(self.quiz, self.question, answer, correct,
+                               latency)
 
         self.set_answer_response(correct_answer, correct)
 
 
+    def draw_question(self):
+        """ Return the next question to ask
+
+            In an exam, this is the next question on the paper (drawing the
+            paper first, for a new quiz), or None once the paper is done.
+        """
+
+        if self.exam == None:
+            try:
+                return self.quiz.get_question()
+            finally:
+                for error in self.quiz.skipped:
+                    self.report_skipped("Question skipped due to {}".format(
+                                                                    error))
+                del self.quiz.skipped[:]
+
+        if self.paper == None or self.paper.quiz is not self.quiz:
+            from exam import ExamPaper
+            self.paper = ExamPaper(self.quiz, self.exam, self.seed)
+        return self.paper.next_question()
+
+
+    def choice_order(self, question):
+        """ Return the choice ids of 'question', in the order to show them
+
+            In an exam, the order is part of the paper; otherwise, it is
+            random.
+        """
+
+        if self.paper != None and self.paper.quiz is self.quiz:
+            return self.paper.choice_order(question)
+        order = list(question.choices)
+        shuffle(order)
+        return order
+
+
+    def check_reload(self):
+        """ Reload the quiz if it's file has changed (when watching) """
+
+        if self.watch == None or time.time() - self.last_poll < self.watch:
+            return
+        if self.paper != None and self.paper.quiz is self.quiz:
+            return # The paper refers to the questions by position
+        self.last_poll = time.time()
+
+        if self.reloader == None or self.reloader.quiz is not self.quiz:
+            from quizreload import QuizReloader
+            self.reloader = QuizReloader(self.quiz)
+        if not self.reloader.changed():
+            return
+
+        try:
+            unchanged, changed, added, removed = self.reloader.reload()
+        except QuizException as error:
+            self.report_reload("Quiz not reloaded due to {}".format(error))
+            return
+        if self.checkpoint != None:
+            self.checkpoint.snapshot(self.quiz, None) # Positions have moved
+        self.report_reload("Quiz reloaded: {} question(s) changed, {} added, "
+                           "{} removed".format(changed, added, removed))
+
+
+    def question_asked(self):
+        """ Note that the current question is about to be shown
+
+            The question is saved to the checkpoint (if any), and the time
+            is kept for timing the answer.
+        """
+
+        self.asked_at = time.time()
+        if self.checkpoint != None:
+            self.checkpoint.record_question(self.quiz, self.question,
+                                            self.paper)
+
+
+    def resume(self):
+        """ Restore the session saved in the checkpoint, if there is one
+
+            The quiz is reloaded (from the compiled cache, where possible)
+            with the scheduler it was using. An exam paper being sat is drawn
+            again from the saved seed, and carried on from where it was left;
+            if the saved session was not an exam, a new paper is started.
+        """
+
+        def opener(quiz_file, scheduler):
+            self.scheduler = scheduler
+            return self.parse_quiz(quiz_file)
+
+        restored = self.checkpoint.restore(opener)
+        if restored == None:
+            return
+        self.quiz, self.question, exam = restored
+        self.asked_at = time.time()
+
+        if exam != None:
+            from exam import ExamPaper
+            self.exam = exam['count']
+            self.seed = exam['seed']
+            self.paper = ExamPaper(self.quiz, self.exam, self.seed)
+            self.paper.asked = exam['asked']
+            self.paper.correct = exam['correct']
+        elif self.exam != None:
+            self.question = None # Start the paper from the first question
+
+
+    def open_quiz(self, quiz_file):
+        """ Return the Quiz for quiz_file, using the current settings
+
+            quiz_file may also be the name of a quiz in the library; for
+            quizzes in the library, any previously parsed copy is reused.
+        """
+
+        quiz = None
+        if self.library != None:
+            name = self.library.find(quiz_file)
+            if name != None:
+                quiz = self.library.get(name, self.parse_quiz)
+        if quiz == None:
+            quiz = self.parse_quiz(quiz_file)
+
+        if self.question_filter != None:
+            matches = quiz.search(self.question_filter)
+            if len(matches) == 0:
+                raise QuizException("No questions match '{}'!".format(
+                                                    self.question_filter))
+            quiz.restrict(matches)
+        elif quiz.active != None:
+            quiz.restrict(None)
+
+        if self.exam != None:
+            from exam import ExamPaper
+            self.paper = ExamPaper(quiz, self.exam, self.seed)
+        return quiz
+
+
+    def parse_quiz(self, quiz_file):
+        """ Parse and return the Quiz for quiz_file """
+
+        return Quiz(quiz_file, stats=self.stats, scheduler=self.scheduler,
+                    tolerance=self.tolerance, lazy=self.lazy)
+
+
     # UI related stuff...
 
 
@@ -307,4 +1383,22 @@ class BaseQuiz(object):
         raise NotImplementedError("Base quiz is only a template!")
 
 
+    def report_reload(self, message):
+        """ Tell the user that the quiz was (or could not be) reloaded """
+
+        pass
+
+
+    def report_skipped(self, message):
+        """ Tell the user that a question could not be asked """
+
+        pass
+
+
+    def exam_finished(self):
+        """ Finish quizzing once the exam paper is done """
+
+        self.quit()
+
+
 
@@ -0,0 +1,57 @@
+""" Batched writes for Quizzer.
+
+    The stats store, the event log and session checkpoints all buffer what
+    they record and write it in batches, so that recording an answer rarely
+    waits on the disk. BatchWriter holds the buffering they share.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import time
+
+
+class BatchWriter(object):
+    """ Base class for buffering records and writing them in batches
+
+        Subclasses keep the buffered records in self.pending, call
+        flush_if_due after adding one, and write them (emptying
+        self.pending) in write_pending.
+    """
+
+    def __init__(self, batch_size, flush_interval):
+        """ Initialise the buffering
+
+            Buffered records are written once 'batch_size' of them have
+            built up, or 'flush_interval' seconds after the last write.
+        """
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+
+
+    def flush_if_due(self):
+        """ Write the buffered records if enough have built up, or the last
+            write was long enough ago
+        """
+
+        if len(self.pending) >= self.batch_size or \
+                time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+
+    def flush(self):
+        """ Write any buffered records """
+
+        self.last_flush = time.time()
+        if len(self.pending) == 0:
+            return
+        self.write_pending()
+
+
+    def write_pending(self):
+        """ Write the (non empty) buffered records, and empty the buffer """
+
+        raise NotImplementedError("BatchWriter is only a template!")
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+""" Benchmarks for Quizzer.
+
+    Generates synthetic quizzes of various sizes and times the hot paths:
+    parsing a quiz, loading it from the compiled cache, drawing questions
+    and recording answers. Peak memory while parsing is measured with
+    tracemalloc. The cold start time of the CLI (from launching a new
+    process to the first question being shown) is measured too, along with
+    the time for Python itself to start, for comparison. The results are
+    printed as JSON, so that they can be compared between releases.
+
+    Usage: python benchmark.py [--sizes 1000 100000 1000000] [--output FILE]
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from basequiz import Quiz
+import quizcache
+
+# The CLI, for timing startup
+QUIZZER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "quizzer.py")
+
+
+def generate_quiz(path, count, multichoice=0.5, choices=4, seed=0):
+    """ Write a synthetic quiz with 'count' questions to 'path'
+
+        'multichoice' is the fraction of questions that are multichoice,
+        each with 'choices' possible answers.
+    """
+
+    rand = random.Random(seed)
+    with open(path, 'w') as quiz:
+        quiz.write("# Synthetic benchmark quiz\n\n")
+        for number in range(count):
+            if rand.random() < multichoice:
+                quiz.write("Which choice is number {}?: {}\n".format(number,
+                                              rand.randrange(choices)))
+                for choice in range(choices):
+                    quiz.write("    {}: Choice {} for question {}\n".format(
+                                              choice, choice, number))
+            else:
+                quiz.write("What is the answer to question {}?: {}\n".format(
+                                              number, rand.randrange(10 ** 6)))
+            quiz.write("\n")
+
+
+def time_call(function, *args):
+    """ Return (seconds taken, result) for function(*args) """
+
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def time_startup(command, prompt=None):
+    """ Return the seconds from launching 'command' to it printing 'prompt'
+
+        If 'prompt' is None, the time for the command to finish is returned.
+        Input is closed, so that an interactive command quits once it asks
+        for any.
+    """
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    output = b""
+    if prompt != None:
+        while prompt not in output:
+            data = process.stdout.read1(4096)
+            if len(data) == 0:
+                raise RuntimeError("{} exited before printing {}".format(
+                                   command, prompt))
+            output += data
+        elapsed = time.perf_counter() - start
+    process.stdin.close()
+    process.stdout.read()
+    process.wait()
+    if prompt == None:
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def bench_startup(path, runs):
+    """ Return the (best, median) seconds for the CLI to show the first
+        question of the quiz at 'path', over 'runs' new processes
+
+        The compiled cache is built first, as it would be after the first
+        run.
+    """
+
+    Quiz(path)
+    times = sorted(time_startup([sys.executable, QUIZZER, "--quiz", path],
+                                b"Answer: ")
+                   for run in range(runs))
+    return times[0], times[len(times) // 2]
+
+
+def bench_quiz(path, draws, answers, startup_runs):
+    """ Benchmark the quiz at 'path', returning a dict of results """
+
+    results = {'file_bytes': os.path.getsize(path)}
+
+    # Parsing (without the cache)
+    parse_time, quiz = time_call(Quiz, path, False)
+    results['questions'] = len(quiz.questions)
+    results['parse_seconds'] = parse_time
+
+    # Building and loading the compiled cache
+    if os.path.exists(quizcache.cache_path(path)):
+        os.remove(quizcache.cache_path(path))
+    results['compile_seconds'], quiz = time_call(Quiz, path)
+    results['cached_load_seconds'], quiz = time_call(Quiz, path)
+
+    # Drawing questions; the first draw builds the scheduler
+    results['first_draw_seconds'], question = time_call(quiz.get_question)
+    start = time.perf_counter()
+    for i in range(draws):
+        quiz.get_question()
+    results['draws_per_second'] = draws / (time.perf_counter() - start)
+
+    # Recording answers
+    questions = [quiz.get_question() for i in range(answers)]
+    start = time.perf_counter()
+    for number, question in enumerate(questions):
+        quiz.record_answer(question, number % 3 != 0)
+    results['answers_per_second'] = answers / (time.perf_counter() - start)
+
+    # Peak memory while parsing
+    quiz = questions = question = None
+    tracemalloc.start()
+    quiz = Quiz(path, False)
+    results['parse_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Cold start of the CLI
+    quiz = None
+    if startup_runs > 0:
+        results['startup_best_seconds'], results['startup_median_seconds'] = \
+                bench_startup(path, startup_runs)
+
+    return results
+
+
+def main():
+    """ Run the benchmarks from the command line """
+
+    parser = argparse.ArgumentParser(description="Benchmark Quizzer")
+    parser.add_argument("--sizes", nargs='+', type=int,
+                        default=[1000, 100000, 1000000],
+                        help="Quiz sizes (in questions) to benchmark")
+    parser.add_argument("--multichoice", type=float, default=0.5,
+                        help="Fraction of multichoice questions")
+    parser.add_argument("--choices", type=int, default=4,
+                        help="Number of choices per multichoice question")
+    parser.add_argument("--draws", type=int, default=100000,
+                        help="Number of questions to draw")
+    parser.add_argument("--answers", type=int, default=100000,
+                        help="Number of answers to record")
+    parser.add_argument("--startup-runs", type=int, default=10,
+                        help="Number of times to start the CLI, for " +
+                             "timing startup (0 to skip)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for generating the quizzes")
+    parser.add_argument("--output", default=None,
+                        help="File to write the JSON results to")
+    args = parser.parse_args()
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+              'multichoice': args.multichoice,
+              'choices': args.choices,
+              'results': []}
+
+    if args.startup_runs > 0:
+        # The baseline for the CLI startup times
+        report['python_startup_seconds'] = min(
+                time_startup([sys.executable, "-c", "pass"])
+                for run in range(args.startup_runs))
+
+    directory = tempfile.mkdtemp(prefix="quizzer-bench-")
+    try:
+        for size in args.sizes:
+            path = os.path.join(directory, "bench-{}.quiz".format(size))
+            generate_quiz(path, size, args.multichoice, args.choices,
+                          args.seed)
+            results = bench_quiz(path, args.draws, args.answers,
+                                 args.startup_runs)
+            results['size'] = size
+            report['results'].append(results)
+            sys.stderr.write("Benchmarked {} questions\n".format(size))
+    finally:
+        shutil.rmtree(directory)
+
+    output = json.dumps(report, indent=4, sort_keys=True)
+    if args.output != None:
+        with open(args.output, 'w') as results_file:
+            results_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+""" Session checkpoints for Quizzer.
+
+    A checkpoint file holds enough of a quizzing session (the quiz, the
+    question being asked, the question stats, the scheduler and the progress
+    through any exam paper) to carry on exactly where it was left. It starts
+    with a full snapshot, followed by small fixed size records of what has
+    changed since; once the records outgrow the snapshot, a fresh snapshot
+    replaces the file. Records are buffered and appended in batches.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import os
+import struct
+import time
+from array import array
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from batching import BatchWriter
+from scheduler import SCHEDULERS
+
+# Bump this whenever the snapshot changes shape
+CHECKPOINT_VERSION = 2
+
+# A change since the snapshot: (kind, position, value, value)
+RECORD = struct.Struct('<bqqq')
+
+# Kinds of record
+QUESTION = 0 # A question was asked: (position, total questions, unused)
+ANSWER = 1 # A question was answered: (position, correct, wrong)
+
+
+class Checkpoint(BatchWriter):
+    """ A checkpoint file for a single session """
+
+    def __init__(self, path, batch_size=16, flush_interval=5):
+        """ Initialise the checkpoint at 'path', buffering records (see
+            BatchWriter)
+        """
+
+        BatchWriter.__init__(self, batch_size, flush_interval)
+        self.path = path
+
+        self.quiz = None # The quiz being checkpointed
+        self.paper = None # The exam paper being checkpointed, if any
+        self.position = None # Position of the question being asked
+        self.pending = [] # Packed records not yet written
+        self.size = 0 # Size of the snapshot
+        self.records = 0 # Records written since the snapshot
+
+
+    def snapshot(self, quiz, position, paper=None):
+        """ Replace the checkpoint with a full snapshot of 'quiz'
+
+            'position' is the position of the question being asked, or None.
+            'paper' is the exam.ExamPaper being sat, if any; only the seed and
+            the progress through it are saved, as the paper can be drawn
+            again from them.
+        """
+
+        exam = None
+        if paper != None:
+            exam = {'count': len(paper),
+                    'seed': paper.seed,
+                    'asked': paper.asked,
+                    'correct': paper.correct}
+
+        stat = os.stat(quiz.name)
+        state = {'version': CHECKPOINT_VERSION,
+                 'quiz': quiz.name,
+                 'size': stat.st_size,
+                 'mtime': stat.st_mtime,
+                 'scheduler': quiz.scheduler,
+                 'schedule': quiz._scheduler,
+                 'active': quiz.active,
+                 'total_questions': quiz.total_questions,
+                 'correct': quiz.questions.correct.tobytes(),
+                 'wrong': quiz.questions.wrong.tobytes(),
+                 'position': position,
+                 'exam': exam}
+        data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+
+        temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temp_path, 'wb') as checkpoint:
+            checkpoint.write(data)
+        os.rename(temp_path, self.path)
+
+        self.quiz = quiz
+        self.paper = paper
+        self.position = position
+        self.pending = []
+        self.size = len(data)
+        self.records = 0
+        self.last_flush = time.time()
+
+
+    def record_question(self, quiz, question, paper=None):
+        """ Record that 'question' is being asked, from 'paper' if an exam
+            paper is given
+        """
+
+        if quiz is not self.quiz or paper is not self.paper:
+            self.snapshot(quiz, question.position, paper)
+            return
+        self.position = question.position
+        self.add(QUESTION, question.position, quiz.total_questions, 0)
+
+
+    def record_answer(self, quiz, question, paper=None):
+        """ Record the stats of 'question' after it was answered """
+
+        if quiz is not self.quiz or paper is not self.paper:
+            self.snapshot(quiz, question.position, paper)
+            return
+        self.add(ANSWER, question.position, question.correct, question.wrong)
+
+
+    def add(self, kind, position, first, second):
+        """ Buffer a record, flushing the buffer if needed """
+
+        self.pending.append(RECORD.pack(kind, position, first, second))
+        self.flush_if_due()
+
+
+    def write_pending(self):
+        """ Write the buffered records
+
+            If the records would outgrow the snapshot, a new snapshot is
+            written instead, so resuming never replays more than a
+            snapshot's worth of records.
+        """
+
+        if (self.records + len(self.pending)) * RECORD.size > self.size:
+            self.snapshot(self.quiz, self.position, self.paper)
+            return
+
+        with open(self.path, 'ab') as checkpoint:
+            checkpoint.write(b''.join(self.pending))
+        self.records += len(self.pending)
+        self.pending = []
+
+
+    def restore(self, opener):
+        """ Restore the checkpointed session
+
+            'opener' is called with the quiz file and scheduler name, and
+            must return the Quiz. Returns (quiz, question, exam), or None if
+            there is no checkpoint or it is stale (the quiz has since
+            changed). 'exam' is None, or a dict of the 'count' and 'seed' of
+            the exam paper being sat and the questions 'asked' and answered
+            'correct' so far.
+        """
+
+        try:
+            checkpoint = open(self.path, 'rb')
+        except (IOError, OSError):
+            return None
+
+        with checkpoint:
+            try:
+                state = pickle.load(checkpoint)
+            except Exception:
+                return None # A corrupt checkpoint is no checkpoint
+            if state.get('version') != CHECKPOINT_VERSION:
+                return None
+            size = checkpoint.tell()
+            data = checkpoint.read()
+
+        try:
+            stat = os.stat(state['quiz'])
+        except (IOError, OSError):
+            return None
+        if stat.st_size != state['size'] or stat.st_mtime != state['mtime']:
+            return None
+
+        quiz = opener(state['quiz'], state['scheduler'])
+        quiz.active = state['active']
+        quiz.total_questions = state['total_questions']
+        quiz.questions.correct = array('q')
+        quiz.questions.correct.frombytes(state['correct'])
+        quiz.questions.wrong = array('q')
+        quiz.questions.wrong.frombytes(state['wrong'])
+        quiz._stats_loaded = True # The checkpoint is newer than the store
+        quiz._scheduler = state['schedule']
+        if quiz._scheduler != None:
+            quiz._scheduler.quiz = quiz
+
+        # Replay the changes since the snapshot
+        position = state['position']
+        exam = state['exam']
+        records = len(data) // RECORD.size
+        if len(data) % RECORD.size != 0:
+            # Drop a partly written record, so that new records line up
+            with open(self.path, 'r+b') as checkpoint:
+                checkpoint.truncate(size + records * RECORD.size)
+        for offset in range(0, records * RECORD.size, RECORD.size):
+            kind, changed, first, second = RECORD.unpack_from(data, offset)
+            if kind == QUESTION:
+                position = changed
+                quiz.total_questions = first
+                if exam != None:
+                    exam['asked'] += 1 # Drawn from the paper
+                else:
+                    # Redo the draw, as Quiz.get_question did
+                    if quiz._scheduler == None:
+                        quiz._scheduler = SCHEDULERS[quiz.scheduler](quiz)
+                    quiz._scheduler.replay(position)
+            elif kind == ANSWER:
+                if exam != None and first > quiz.questions.correct[changed]:
+                    exam['correct'] += 1
+                quiz.questions.correct[changed] = first
+                quiz.questions.wrong[changed] = second
+                quiz.update_question(changed)
+
+        self.quiz = quiz
+        self.paper = None # Set once the interface has drawn the paper again
+        self.position = position
+        self.pending = []
+        self.size = size
+        self.records = records
+        self.last_flush = time.time()
+
+        question = None
+        if position != None:
+            question = quiz.questions[position]
+        return quiz, question, exam
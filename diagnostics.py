@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+""" Scheduler diagnostics for Quizzer.
+
+    Checks that a quiz's scheduler picks questions with the probabilities
+    given by their weights (Question.weight, with negative weights counted
+    as zero). Many questions are drawn in a tight loop, without answering
+    any, so the weights stay fixed; the number of times each question was
+    drawn is then compared with the number expected using a chi-square
+    test. The skew of the worst question and the draws per second are
+    reported as well, so that a new sampler or weighting function can be
+    checked (and timed) before it is used. Only weight-based schedulers can
+    be checked; the Leitner scheduler picks questions by when they are due.
+
+    A fresh quiz gives every question the same weight, which is a weak
+    test; so by default each question is given random stats first, spread
+    so that some weights are clamped to zero.
+
+    Usage: python diagnostics.py QUIZ [--draws N] [--spread N] [--seed N]
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+
+from basequiz import Quiz, QuizException
+from scheduler import SCHEDULERS, WeightedScheduler
+
+# Significance level below which the sampler fails the check
+ALPHA = 0.001
+
+# Default number of answers in the random stats given to each question
+SPREAD = 4
+
+# Schedulers that pick questions by their weights, which can be checked
+WEIGHTED = sorted(name for name, scheduler in SCHEDULERS.items()
+                  if issubclass(scheduler, WeightedScheduler))
+
+
+def chi_square_p(statistic, freedom):
+    """ Return the chance of a chi-square statistic at least 'statistic'
+        with 'freedom' degrees of freedom
+
+        This uses the Wilson-Hilferty approximation, which is accurate to a
+        few decimal places for the (large) degrees of freedom here.
+    """
+
+    if freedom <= 0:
+        return 1.0
+    scale = 2.0 / (9 * freedom)
+    z = ((statistic / freedom) ** (1.0 / 3) - (1 - scale)) / math.sqrt(scale)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def randomize_stats(quiz, spread, seed):
+    """ Give each question random stats, of up to 'spread' answers each """
+
+    rand = random.Random(seed)
+    for position in range(len(quiz.questions)):
+        quiz.questions.correct[position] = rand.randint(0, spread)
+        quiz.questions.wrong[position] = rand.randint(0, spread)
+
+
+def diagnose(quiz, draws):
+    """ Draw 'draws' questions from 'quiz', and compare them with the weights
+
+        Returns a dict of the results; 'passed' is False if the draws are
+        unlikely (at the ALPHA level) to have come from the weights, or if a
+        question with no weight was drawn. Raises a QuizException if the
+        quiz's scheduler is not weight-based.
+    """
+
+    if quiz.scheduler not in WEIGHTED:
+        raise QuizException("The {} scheduler is not weight-based!".format(
+                                                            quiz.scheduler))
+
+    positions = quiz.active
+    if positions == None:
+        positions = range(len(quiz.questions))
+    weights = quiz.questions.weights(quiz.total_questions)
+    expected = dict((position, max(weights[position], 0))
+                    for position in positions)
+    total = sum(expected.values())
+    if total <= 0:
+        # Every weight is zero, so every question is equally likely
+        expected = dict((position, 1) for position in positions)
+        total = len(expected)
+
+    # Draw the questions; answering nothing leaves the weights unchanged
+    counts = [0] * len(quiz.questions)
+    get_question = quiz.get_question
+    start = time.time()
+    for draw in range(draws):
+        counts[get_question().position] += 1
+    elapsed = time.time() - start
+
+    statistic = 0.0
+    freedom = -1
+    impossible = 0 # Draws of questions that should never be picked
+    worst = None # (standardised residual, position)
+    max_error = 0.0 # Largest relative error in a question's draws
+    for position, weight in expected.items():
+        count = counts[position]
+        if weight <= 0:
+            impossible += count
+            continue
+        mean = float(draws) * weight / total
+        statistic += (count - mean) ** 2 / mean
+        freedom += 1
+        residual = (count - mean) / math.sqrt(mean)
+        if worst == None or abs(residual) > abs(worst[0]):
+            worst = (residual, position)
+        max_error = max(max_error, abs(count - mean) / mean)
+    impossible += sum(counts) - sum(counts[position]
+                                    for position in expected)
+    p = chi_square_p(statistic, freedom)
+
+    weighted = [weight for weight in expected.values() if weight > 0]
+    return {'quiz': quiz.name,
+            'scheduler': quiz.scheduler,
+            'questions': len(expected),
+            'weighted_questions': len(weighted),
+            'draws': draws,
+            'seconds': elapsed,
+            'draws_per_second': draws / elapsed if elapsed > 0 else None,
+            'min_expected': float(draws) * min(weighted) / total,
+            'chi_square': statistic,
+            'degrees_of_freedom': freedom,
+            'p_value': p,
+            'impossible_draws': impossible,
+            'max_relative_error': max_error,
+            'worst_residual': worst[0],
+            'worst_question': quiz.questions[worst[1]].id,
+            'passed': p >= ALPHA and impossible == 0}
+
+
+def main():
+    """ Diagnose the quiz given on the command line """
+
+    parser = argparse.ArgumentParser(
+                description="Check that a Quizzer scheduler picks " +
+                            "questions by their weights")
+    parser.add_argument("quiz", help="Quiz file to draw questions from")
+    parser.add_argument("--draws", default=1000000, type=int,
+                        help="Number of questions to draw")
+    parser.add_argument("--spread", default=SPREAD, type=int,
+                        help="Give each question random stats of up to " +
+                             "this many answers (0 to keep them fresh)")
+    parser.add_argument("--seed", default=0, type=int,
+                        help="Seed for the random stats and the draws")
+    parser.add_argument("--scheduler", default="weighted", choices=WEIGHTED,
+                        help="Scheduler to check")
+    args = parser.parse_args()
+    if args.draws < 1:
+        parser.error("--draws must be at least one!")
+
+    random.seed(args.seed)
+    try:
+        quiz = Quiz(args.quiz, scheduler=args.scheduler)
+    except QuizException as error:
+        parser.error(str(error))
+    if args.spread > 0:
+        randomize_stats(quiz, args.spread, args.seed)
+    results = diagnose(quiz, args.draws)
+    print(json.dumps(results, indent=4, sort_keys=True))
+    sys.exit(0 if results['passed'] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+""" Answer event log for Quizzer.
+
+    Every answer is appended to a log as a line of JSON, recording the
+    question (by id, so that logs can be joined across edits of the quiz),
+    the answer given, whether it was correct and how long it took.
+    Once the log grows past a size limit it is rotated: the full log is
+    renamed with the next free number ('events.log.1', 'events.log.2', ...)
+    and a new log is started, so old events are never rewritten. Events are
+    buffered and written in batches. See analytics for reading the logs.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import json
+import os
+import time
+
+from batching import BatchWriter
+
+
+class EventLog(BatchWriter):
+    """ A rotating, append only log of answer events """
+
+    def __init__(self, path, max_size=64 * 1024 * 1024, batch_size=64,
+                 flush_interval=5):
+        """ Open (or create) the log at 'path', buffering events (see
+            BatchWriter)
+
+            The log is rotated once it is over 'max_size' bytes.
+        """
+
+        BatchWriter.__init__(self, batch_size, flush_interval)
+        self.path = path
+        self.max_size = max_size
+
+        self.pending = [] # Lines not yet written
+
+
+    def record(self, quiz, question, answer, correct, latency):
+        """ Record an answer to 'question' in 'quiz'
+
+            'latency' is the time (in seconds) taken to answer, or None if
+            it is not known.
+        """
+
+        if latency != None:
+            latency = round(latency, 3)
+        event = {'time': round(time.time(), 3),
+                 'quiz': quiz.name,
+                 'question': question.id,
+                 'answer': answer,
+                 'correct': correct,
+                 'latency': latency}
+        self.pending.append(json.dumps(event, sort_keys=True) + "\n")
+        self.flush_if_due()
+
+
+    def write_pending(self):
+        """ Write the buffered events, rotating the log if needed """
+
+        data = "".join(self.pending).encode('utf-8')
+        with open(self.path, 'ab') as log:
+            log.write(data)
+            size = log.tell()
+        self.pending = []
+
+        if size >= self.max_size:
+            self.rotate()
+
+
+    def rotate(self):
+        """ Move the current log aside, under the next free number """
+
+        number = 1
+        while os.path.exists("{}.{}".format(self.path, number)):
+            number += 1
+        os.rename(self.path, "{}.{}".format(self.path, number))
+
+
+    def close(self):
+        """ Flush any buffered events """
+
+        self.flush()
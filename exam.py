@@ -0,0 +1,92 @@
+""" Exam papers for Quizzer.
+
+    An exam asks a fixed number of distinct questions, chosen at random
+    from a seed so that the same paper can be set again. The whole paper
+    (the questions and the order of the choices for each) is drawn up front,
+    in time and memory proportional to the length of the paper rather than
+    the size of the quiz.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import random
+
+from basequiz import QuizException
+
+
+def sample_indices(count, size, rand):
+    """ Return 'count' distinct random indices in range(size), in O(count)
+
+        This is a partial Fisher-Yates shuffle of range(size); only the
+        swapped entries are stored, in a dict, so the range itself is never
+        built.
+    """
+
+    swapped = {} # Index: value, for the entries moved by the shuffle
+    chosen = []
+    for i in range(count):
+        j = rand.randrange(i, size)
+        chosen.append(swapped.get(j, j))
+        swapped[j] = swapped.get(i, i)
+    return chosen
+
+
+class ExamPaper(object):
+    """ A pre-drawn exam paper over a quiz """
+
+    def __init__(self, quiz, count, seed):
+        """ Draw a paper of 'count' distinct questions from 'quiz'
+
+            Only the questions being asked (see Quiz.restrict) are drawn
+            from. The same quiz, count and seed always give the same paper.
+        """
+
+        if quiz.active != None:
+            population = quiz.active
+        else:
+            population = range(len(quiz.questions))
+        if not 0 < count <= len(population):
+            raise QuizException("Cannot set an exam of {} questions from {}!"
+                                .format(count, len(population)))
+
+        self.quiz = quiz
+        self.seed = seed
+
+        rand = random.Random(seed)
+        self.positions = [population[i]
+                          for i in sample_indices(count, len(population),
+                                                  rand)]
+        self.orders = {} # Position: choice ids, in the order to show them
+        for position in self.positions:
+            choices = quiz.questions[position].choices
+            if choices != None:
+                order = sorted(choices)
+                rand.shuffle(order)
+                self.orders[position] = order
+
+        self.asked = 0 # Questions asked so far
+        self.correct = 0 # Correct answers so far
+
+
+    def __len__(self):
+        """ Return the number of questions in the paper """
+
+        return len(self.positions)
+
+
+    def next_question(self):
+        """ Return the next question, or None if the paper is finished """
+
+        if self.asked == len(self.positions):
+            return None
+        position = self.positions[self.asked]
+        self.asked += 1
+        return self.quiz.questions[position]
+
+
+    def choice_order(self, question):
+        """ Return the choice ids of 'question' in the order to show them """
+
+        return self.orders[question.position]
@@ -0,0 +1,226 @@
+""" Batch grading of answer sheets for Quizzer.
+
+    Grades answer sheets (for example, from paper exams) against a quiz, in
+    bulk. The sheets are read as a stream, in chunks of raw lines, which a
+    process pool parses and grades against a lookup table of the correct
+    answers. Results are written out in the order of the sheets as they are
+    graded, and only a few chunks are in flight at once, so any number of
+    sheets can be graded in constant memory.
+
+    Sheet formats:
+
+    - JSON lines: one sheet per line, as
+      {"sheet": <name>, "answers": {<question>: <answer>, ...}}
+    - CSV (files ending in '.csv'): a header row of 'sheet' followed by
+      the questions, and then a row per sheet (each on a single line).
+
+    Questions are identified by their id, or by their text; the question
+    stats are always reported by id.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import csv
+import json
+import sys
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
+from basequiz import Quiz, QuizException
+from answermatch import AnswerMatcher
+
+# Sheets per chunk sent to a worker
+CHUNK_SIZE = 500
+
+# The answer lookup table and sheet format, shared with the workers
+_shared = None
+
+
+def build_lookup(quiz):
+    """ Return a dict of question id or text: (id, normalised answer,
+        allow typos)
+
+        Ids take precedence over question text, should they clash.
+    """
+
+    lookup = {}
+    for question in quiz.questions:
+        entry = (question.id, question.normalized, question.sort == 'prompt')
+        lookup.setdefault(question.question, entry)
+        lookup[question.id] = entry
+    return lookup
+
+
+def parse_sheet(line, line_num, sheet_format, header):
+    """ Return (sheet name, answers dict) for a line of a sheets file """
+
+    if sheet_format == 'csv':
+        row = next(csv.reader([line]))
+        name = row[0] if len(row) != 0 and row[0] != "" else str(line_num)
+        return name, dict((question, answer)
+                          for question, answer in zip(header[1:], row[1:])
+                          if answer != "")
+
+    sheet = json.loads(line)
+    answers = sheet['answers']
+    if not isinstance(answers, dict):
+        raise TypeError("answers must be an object, not {}".format(
+                                                    type(answers).__name__))
+    return str(sheet.get('sheet', line_num)), answers
+
+
+def _init_worker(shared):
+    """ Set up the shared lookup table, unless it was inherited """
+
+    global _shared
+    if _shared == None:
+        _shared = shared
+
+
+def grade_chunk(task):
+    """ Grade a chunk of sheets, given as (first line number, lines)
+
+        Returns (sheet results, question stats), where the question stats
+        are a dict of question id: [answered, correct].
+    """
+
+    first, lines = task
+    lookup, matcher, sheet_format, header = _shared
+
+    results = []
+    stats = {}
+    for line_num, line in enumerate(lines, first):
+        if len(line.strip()) == 0:
+            continue
+        try:
+            name, answers = parse_sheet(line, line_num, sheet_format, header)
+        except (ValueError, KeyError, TypeError, AttributeError,
+                csv.Error) as error:
+            results.append({'sheet': str(line_num),
+                            'error': "unreadable sheet: {}".format(error)})
+            continue
+
+        correct = answered = unknown = 0
+        for question, answer in answers.items():
+            if question not in lookup:
+                unknown += 1
+                continue
+            question_id, normalized, fuzzy = lookup[question]
+            right = matcher.matches(normalized, str(answer), fuzzy)
+
+            answered += 1
+            if question_id not in stats:
+                stats[question_id] = [0, 0]
+            stats[question_id][0] += 1
+            if right:
+                correct += 1
+                stats[question_id][1] += 1
+
+        results.append({'sheet': name,
+                        'answered': answered,
+                        'correct': correct,
+                        'unknown': unknown,
+                        'score': round(float(correct) / answered, 4)
+                                 if answered != 0 else None})
+    return results, stats
+
+
+def read_chunks(sheets, chunk_size=CHUNK_SIZE, start=1):
+    """ Yield (first line number, lines) chunks of the open sheets file
+
+        'start' is the line number of the next line in the file (2 once a
+        header has been read). Blank lines are kept, so that the lines of a
+        chunk can be numbered from the first.
+    """
+
+    chunk = []
+    first = start
+    for line_num, line in enumerate(sheets, start):
+        if len(chunk) == 0:
+            first = line_num
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield first, chunk
+            chunk = []
+    if len(chunk) != 0:
+        yield first, chunk
+
+
+def grade(quiz_file, sheets_file, output=sys.stdout, question_output=None,
+          tolerance=0, jobs=None):
+    """ Grade the sheets in 'sheets_file' against 'quiz_file'
+
+        A line of JSON is written to 'output' for each sheet, in order, and
+        (if given) a line for each question to 'question_output' once every
+        sheet is graded. Returns (sheets graded, question stats).
+    """
+
+    global _shared
+
+    quiz = Quiz(quiz_file)
+    sheet_format = 'csv' if sheets_file.endswith('.csv') else 'jsonl'
+
+    try:
+        sheets = open(sheets_file)
+    except (IOError, OSError) as error:
+        raise QuizException("Answer sheets '{}' could not be read: {}"
+                            .format(sheets_file, error))
+
+    if jobs == None:
+        jobs = cpu_count()
+
+    graded = 0
+    stats = {}
+    with sheets:
+        header = None
+        start = 1 # Line number of the first sheet
+        if sheet_format == 'csv':
+            header = next(csv.reader([sheets.readline()]), None)
+            if header == None:
+                raise QuizException("Answer sheets '{}' have no header!"
+                                    .format(sheets_file))
+            start = 2
+
+        _shared = (build_lookup(quiz), AnswerMatcher(tolerance),
+                   sheet_format, header)
+        pool = Pool(jobs, _init_worker, (_shared,))
+        try:
+            # Keep a few chunks in flight, writing results in order
+            pending = deque()
+            chunks = read_chunks(sheets, start=start)
+            while True:
+                while len(pending) < jobs * 2:
+                    chunk = next(chunks, None)
+                    if chunk == None:
+                        break
+                    pending.append(pool.apply_async(grade_chunk, (chunk,)))
+                if len(pending) == 0:
+                    break
+
+                results, chunk_stats = pending.popleft().get()
+                for result in results:
+                    output.write(json.dumps(result, sort_keys=True) + "\n")
+                graded += len(results)
+                for question, (answered, correct) in chunk_stats.items():
+                    if question not in stats:
+                        stats[question] = [0, 0]
+                    stats[question][0] += answered
+                    stats[question][1] += correct
+        finally:
+            pool.close()
+            pool.join()
+            _shared = None
+
+    if question_output != None:
+        for question_id in sorted(stats):
+            answered, correct = stats[question_id]
+            question_output.write(json.dumps(
+                    {'id': question_id,
+                     'question': quiz.by_id(question_id).question,
+                     'answered': answered,
+                     'correct': correct,
+                     'difficulty': round(1 - float(correct) / answered, 4)},
+                    sort_keys=True) + "\n")
+    return graded, stats
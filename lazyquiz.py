@@ -0,0 +1,227 @@
+""" Lazily loaded quizzes for Quizzer.
+
+    For very large quizzes only a small fraction of the questions are ever
+    shown in a session. A LazyQuestionTable memory maps the quiz file and
+    only finds where each question starts; the text of a question is decoded
+    the first time it is needed, and a bounded number of decoded questions
+    are kept. The stats columns are allocated up front as usual, so the
+    schedulers work without decoding anything; saved stats are given to each
+    question as it is first decoded.
+
+    Since each question is parsed on it's own, repeated questions are not
+    given distinct ids, and repeated explicit ids are not reported.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import io
+import mmap
+import re
+from array import array
+from collections import OrderedDict
+
+from basequiz import QuestionTable, QuizException, parse_questions
+from answermatch import normalize
+
+# The first character of a line that may start a question
+QUESTION_START = re.compile(br'^[^\s#]', re.MULTILINE)
+
+# The definition of a named choice set
+SET_START = re.compile(br'^@[^:\n]*$', re.MULTILINE)
+
+# A backslash continuing a line onto the next
+CONTINUATION = re.compile(br'\\\r?\n')
+
+# Fields of a decoded row
+ID, TEXT, ANSWER, NORMALIZED, SORT_CODE, CHOICES = range(6)
+
+
+class LazyColumn(object):
+    """ A read only text column of a LazyQuestionTable """
+
+    def __init__(self, table, field):
+        """ Initialise the column for 'field' of the rows of 'table' """
+
+        self.table = table
+        self.field = field
+
+
+    def __len__(self):
+        """ Return the number of rows """
+
+        return len(self.table.starts)
+
+
+    def __getitem__(self, position):
+        """ Return the field for the row at 'position', decoding the row if
+            needed
+        """
+
+        return self.table.row(position)[self.field]
+
+
+    def __setitem__(self, position, value):
+        """ Lazy quizzes are read only """
+
+        raise TypeError("Lazily loaded questions cannot be changed!")
+
+
+    def __iter__(self):
+        """ Iterate over the field for every row """
+
+        for position in range(len(self)):
+            yield self[position]
+
+
+class LazyQuestionTable(QuestionTable):
+    """ A question table that decodes questions from the file on demand """
+
+    def __init__(self, quiz_file, cache_size=1024):
+        """ Index the questions in quiz_file
+
+            At most 'cache_size' decoded questions are kept at once.
+        """
+
+        QuestionTable.__init__(self)
+
+        self.quiz_file = quiz_file
+        self.cache_size = cache_size
+        self.rows = OrderedDict() # Position: decoded row, least recent first
+        self.saved = {} # Question id: saved stats, for rows not yet decoded
+
+        with open(quiz_file, 'rb') as quiz:
+            try:
+                self.map = mmap.mmap(quiz.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self.map = b'' # An empty file cannot be mapped
+
+        # Find the byte offsets of the questions; only lines following a
+        # backslash might be continuations, so only those need checking
+        continued = set(match.end()
+                        for match in CONTINUATION.finditer(self.map))
+        blocks = [match.start()
+                  for match in QUESTION_START.finditer(self.map)
+                  if match.start() not in continued or
+                     not self.continues(match.start())]
+        blocks.append(len(self.map))
+
+        # Named choice sets are needed by any question, so parse them now
+        self.named_sets = {}
+        set_starts = set(match.start()
+                         for match in SET_START.finditer(self.map))
+        self.starts = array('q')
+        self.ends = array('q')
+        for start, end in zip(blocks, blocks[1:]):
+            if start in set_starts:
+                self.parse_block(start, end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+        self.ids = LazyColumn(self, ID)
+        self.texts = LazyColumn(self, TEXT)
+        self.answers = LazyColumn(self, ANSWER)
+        self.normalized = LazyColumn(self, NORMALIZED)
+        self.sort_codes = LazyColumn(self, SORT_CODE)
+        self.choices = LazyColumn(self, CHOICES)
+        self.correct = array('q', [0]) * len(self.starts)
+        self.wrong = array('q', [0]) * len(self.starts)
+
+
+    def continues(self, start):
+        """ Return True if the line at 'start' continues the previous line """
+
+        if start == 0:
+            return False
+        line_start = self.map.rfind(b'\n', 0, start - 1) + 1
+        previous = self.map[line_start:start].rstrip(b'\r\n')
+        return previous.endswith(b'\\') and not previous.startswith(b'#')
+
+
+    def row(self, position):
+        """ Return the decoded row at 'position', decoding it if needed """
+
+        if position in self.rows:
+            row = self.rows.pop(position)
+        else:
+            row = self.decode(position)
+        self.rows[position] = row # Most recently used
+
+        while len(self.rows) > self.cache_size:
+            self.rows.popitem(last=False)
+        return row
+
+
+    def parse_block(self, start, end):
+        """ Parse and return the questions between the given offsets
+
+            Raises a QuizException if the block has any errors.
+        """
+
+        text = self.map[start:end].decode('utf-8')
+        errors = []
+        questions = list(parse_questions(io.StringIO(text), errors,
+                                         choice_sets=self.named_sets))
+        if len(errors) != 0:
+            # Report the line numbers within the whole file
+            offset = self.map[:start].count(b'\n')
+            errors = [(line_num + offset, message)
+                      for line_num, message in errors]
+            raise QuizException("Quiz file '{}' has {} error(s)".format(
+                                            self.quiz_file, len(errors)),
+                                errors)
+        return questions
+
+
+    def load_row(self, position):
+        """ Decode the row at 'position', raising a QuizException if the
+            question has a syntax error
+
+            Returns True if saved stats were given to the row.
+        """
+
+        if position in self.rows:
+            self.row(position)
+            return False
+        correct, wrong = self.correct[position], self.wrong[position]
+        self.row(position)
+        return (correct, wrong) != (self.correct[position],
+                                    self.wrong[position])
+
+
+    def load_stats(self, saved):
+        """ Keep the saved stats, to give to each row as it is first decoded
+
+            Looking up every row now would decode the whole quiz.
+        """
+
+        self.saved = dict(saved)
+
+
+    def decode(self, position):
+        """ Decode and return the row at 'position'
+
+            Unlike a QuestionTable, nothing is interned, as interned strings
+            would outlive the rows they were decoded for. Questions using a
+            named choice set still share the set.
+        """
+
+        question, = self.parse_block(self.starts[position],
+                                     self.ends[position])
+        stats = self.saved.pop(question.id, None)
+        if stats != None:
+            self.correct[position], self.wrong[position] = stats
+        return (question.id,
+                question.question,
+                question.answer,
+                normalize(question.answer),
+                self.sort_code(question.sort),
+                question.choices)
+
+
+    def append(self, *args, **kargs):
+        """ Lazy quizzes are read only """
+
+        raise TypeError("Lazily loaded quizzes cannot be added to!")
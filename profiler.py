@@ -0,0 +1,140 @@
+""" Hot path instrumentation for Quizzer.
+
+    The profiler wraps selected methods (parsing, question selection,
+    answering and displaying) to record call counts and latency histograms.
+    Nothing is wrapped until the profiler is enabled, so when profiling is
+    off the hot paths run exactly as normal, at no extra cost.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import functools
+import time
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.time
+
+
+class Histogram(object):
+    """ A latency histogram, with power of two microsecond buckets
+
+        Each power of two is split into 2**precision equal sub-buckets, so
+        percentiles are within a factor of 1 + 1/2**precision.
+    """
+
+    def __init__(self, precision=0):
+        """ Initialise an empty histogram """
+
+        self.precision = precision
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {} # Lowest latency in the bucket (in us): count
+
+
+    def width(self, bucket):
+        """ Return the width (in us) of the bucket starting at 'bucket' """
+
+        return 1 << max(bucket.bit_length() - 1 - self.precision, 0)
+
+
+    def add(self, seconds):
+        """ Record a single latency """
+
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        micros = int(seconds * 1000000)
+        bucket = micros - micros % self.width(micros)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+
+    def merge(self, other):
+        """ Add the latencies recorded by 'other' (of the same precision) """
+
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+
+    def percentile(self, fraction):
+        """ Return an upper bound (in seconds) for the given percentile """
+
+        needed = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= needed:
+                return min((bucket + self.width(bucket)) / 1000000.0,
+                           self.max)
+        return self.max
+
+
+class Profiler(object):
+    """ Records latency histograms for a set of wrapped methods """
+
+    def __init__(self):
+        """ Initialise the profiler """
+
+        self.histograms = {} # Label: Histogram
+        self.wrapped = [] # (owner, name, original method)
+
+
+    def wrap(self, owner, name, label=None):
+        """ Start timing the method 'name' of the class 'owner' """
+
+        if label == None:
+            label = "{}.{}".format(owner.__name__, name)
+        original = owner.__dict__[name]
+        histogram = self.histograms.setdefault(label, Histogram())
+
+        @functools.wraps(original)
+        def timed(*args, **kargs):
+            start = timer()
+            try:
+                return original(*args, **kargs)
+            finally:
+                histogram.add(timer() - start)
+
+        setattr(owner, name, timed)
+        self.wrapped.append((owner, name, original))
+
+
+    def enable(self, targets):
+        """ Start timing each (class, method name) in 'targets' """
+
+        for owner, name in targets:
+            self.wrap(owner, name)
+
+
+    def disable(self):
+        """ Stop timing, restoring the original methods """
+
+        while len(self.wrapped) != 0:
+            owner, name, original = self.wrapped.pop()
+            setattr(owner, name, original)
+
+
+    def summary(self):
+        """ Return a table summarising the recorded latencies """
+
+        lines = ["{:<28} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+                    "method", "calls", "mean ms", "p50 ms", "p99 ms",
+                    "max ms")]
+        for label in sorted(self.histograms):
+            histogram = self.histograms[label]
+            if histogram.count == 0:
+                continue
+            lines.append("{:<28} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}"
+                         .format(label, histogram.count,
+                                 1000 * histogram.total / histogram.count,
+                                 1000 * histogram.percentile(0.5),
+                                 1000 * histogram.percentile(0.99),
+                                 1000 * histogram.max))
+        return "\n".join(lines)
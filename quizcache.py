@@ -0,0 +1,165 @@
+""" Compiled quiz cache for Quizzer.
+
+    Parsing a large quiz file is slow, so the parsed questions are saved to a
+    '.quizc' file alongside the quiz. The cache starts with a small header
+    recording the size, modification time and hash of the quiz it was built
+    from; if the quiz has changed since, the cache is ignored and rebuilt.
+
+    After the header come named sections (such as the questions and the
+    search index), each of which can be read without loading the others.
+
+    The cache is written with marshal, which (unlike pickle) only holds
+    plain data, so opening a quiz never runs code from a cache beside it.
+    Sections must therefore only contain the builtin types marshal
+    supports.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import os
+import hashlib
+import marshal
+
+# Bump this whenever the cached data changes shape
+CACHE_VERSION = 7
+
+CACHE_SUFFIX = 'c'
+
+
+def cache_path(quiz_file):
+    """ Return the path of the cache for quiz_file """
+
+    return quiz_file + CACHE_SUFFIX
+
+
+def file_hash(quiz_file):
+    """ Return a hash of the contents of quiz_file """
+
+    digest = hashlib.sha1()
+    with open(quiz_file, 'rb') as quiz:
+        for block in iter(lambda: quiz.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_header(quiz_file, digest=None):
+    """ Return the cache header for quiz_file """
+
+    stat = os.stat(quiz_file)
+    if digest == None:
+        digest = file_hash(quiz_file)
+    return {'version': CACHE_VERSION,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'hash': digest}
+
+
+def write_cache(quiz_file, sections, header=None):
+    """ Save 'sections' as the cache for quiz_file
+
+        'sections' is a list of (name, data) pairs; each section can later be
+        read back on it's own, without loading the others.
+
+        The cache is written to a temporary file first so that a crash never
+        leaves a half written cache behind. Returns True if the cache was
+        written, False if it could not be (eg, a read only directory).
+    """
+
+    if header == None:
+        header = make_header(quiz_file)
+
+    path = cache_path(quiz_file)
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as cache:
+            marshal.dump(header, cache)
+            for name, data in sections:
+                data = marshal.dumps(data)
+                marshal.dump((name, len(data)), cache)
+                cache.write(data)
+        os.rename(temp_path, path)
+    except (IOError, OSError, ValueError):
+        try:
+            os.remove(temp_path)
+        except (IOError, OSError):
+            pass
+        return False
+    return True
+
+
+def read_sections(cache):
+    """ Yield (name, length) for each section in the open cache file
+
+        After each section is yielded, the file is positioned at the start
+        of it's data; if the data is not read, it is skipped.
+    """
+
+    while True:
+        try:
+            name, length = marshal.load(cache)
+        except EOFError:
+            return
+        start = cache.tell()
+        yield name, length
+        cache.seek(start + length)
+
+
+def read_cache(quiz_file, section='questions', digest=None):
+    """ Return (digest, data) for a section of the cache for quiz_file
+
+        Returns None if the cache is missing or stale, or has no such
+        section. If 'digest' is given, the cache must also have been built
+        from the quiz contents with that hash.
+    """
+
+    try:
+        cache = open(cache_path(quiz_file), 'rb')
+    except (IOError, OSError):
+        return None
+
+    with cache:
+        try:
+            header = marshal.load(cache)
+            if header.get('version') != CACHE_VERSION:
+                return None
+            if digest != None and digest != header['hash']:
+                return None
+
+            stat = os.stat(quiz_file)
+            if stat.st_size != header['size']:
+                return None
+
+            fresh = stat.st_mtime == header['mtime']
+            if not fresh:
+                # The file has been touched; check that it really changed
+                if file_hash(quiz_file) != header['hash']:
+                    return None
+
+            for name, length in read_sections(cache):
+                if name == section:
+                    data = marshal.loads(cache.read(length))
+                    break
+            else:
+                return None # No such section
+        except Exception:
+            # A corrupt or incompatible cache is just a stale cache
+            return None
+
+    if not fresh:
+        # Refresh the header so that the hash is not needed next time
+        refresh_cache(quiz_file)
+
+    return header['hash'], data
+
+
+def refresh_cache(quiz_file):
+    """ Rewrite the cache header for quiz_file, keeping the sections """
+
+    with open(cache_path(quiz_file), 'rb') as cache:
+        header = marshal.load(cache)
+        sections = []
+        for name, length in read_sections(cache):
+            sections.append((name, marshal.loads(cache.read(length))))
+    write_cache(quiz_file, sections, make_header(quiz_file, header['hash']))
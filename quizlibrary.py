@@ -0,0 +1,194 @@
+""" Quiz library for Quizzer.
+
+    A library is a directory of quiz files. Scanning the library builds a
+    lightweight index (title, question count, modification time) by skimming
+    each file, without parsing it into questions. Quizzes are only parsed
+    when first used, and parsed quizzes are kept in an LRU cache so that
+    switching back to a quiz is instant.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import os
+from collections import OrderedDict
+
+QUIZ_EXTENSION = '.quiz'
+
+# Rough size of a parsed quiz in memory, as a multiple of its file size
+MEMORY_FACTOR = 3
+
+
+def find_files(paths, extension=""):
+    """ Yield the files in 'paths', searching directories recursively
+
+        Only files ending with 'extension' are yielded from directories;
+        files given directly are always yielded.
+    """
+
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, filenames in os.walk(path):
+                subdirectories.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(extension):
+                        yield os.path.join(directory, filename)
+        else:
+            yield path
+
+
+class QuizInfo(object):
+    """ Index entry for a single quiz file """
+
+    def __init__(self, name, path):
+        """ Initialise the entry by skimming the quiz file at 'path' """
+
+        self.name = name
+        self.path = path
+
+        stat = os.stat(path)
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+
+        self.title = None
+        self.questions = 0
+        continued = False
+        with open(path, 'rb') as quiz:
+            for line in quiz:
+                line = line.rstrip(b'\r\n')
+                if continued:
+                    continued = line.endswith(b'\\')
+                    continue
+                if line.startswith(b'#'):
+                    # Use the first non-decorative comment as the title
+                    if self.title == None and self.questions == 0:
+                        text = line.strip(b'#').strip()
+                        if len(text) != 0:
+                            self.title = text.decode('utf-8', 'replace')
+                elif len(line) != 0 and not line[:1].isspace():
+                    continued = line.endswith(b'\\')
+                    if not (line.startswith(b'@') and b':' not in line):
+                        self.questions += 1 # Not a choice set
+
+        if self.title == None:
+            self.title = name
+
+
+    def cost(self):
+        """ Return the estimated memory used by this quiz once parsed """
+
+        return self.size * MEMORY_FACTOR
+
+
+class QuizLibrary(object):
+    """ A directory of quizzes, with a cache of parsed quizzes """
+
+    def __init__(self, directory, budget=64 * 1024 * 1024):
+        """ Initialise the library for 'directory'
+
+            'budget' is the approximate memory (in bytes) that cached
+            quizzes may use.
+        """
+
+        self.directory = directory
+        self.budget = budget
+
+        self.index = {} # name: QuizInfo
+        self.cache = OrderedDict() # name: Quiz, least recently used first
+        self.cached_cost = 0
+
+        self.scan()
+
+
+    def scan(self):
+        """ Update the index, skimming only new or modified quizzes """
+
+        index = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(QUIZ_EXTENSION):
+                continue
+            name = filename[:-len(QUIZ_EXTENSION)]
+            path = os.path.join(self.directory, filename)
+            if not os.path.isfile(path):
+                continue
+
+            info = self.index.get(name)
+            if info == None or info.mtime != os.path.getmtime(path):
+                info = QuizInfo(name, path)
+                self.forget(name) # Any parsed copy is out of date
+            index[name] = info
+
+        for name in set(self.index) - set(index):
+            self.forget(name)
+        self.index = index
+
+
+    def __contains__(self, name):
+        """ Return True if the library has a quiz called 'name' """
+
+        return name in self.index
+
+
+    def find(self, quiz):
+        """ Return the name of 'quiz' (a name or a path) in the library
+
+            Returns None if the quiz is not part of the library.
+        """
+
+        if quiz in self.index:
+            return quiz
+
+        directory, filename = os.path.split(os.path.abspath(quiz))
+        name = filename[:-len(QUIZ_EXTENSION)]
+        if directory == os.path.abspath(self.directory) and \
+                filename.endswith(QUIZ_EXTENSION) and name in self.index:
+            return name
+        return None
+
+
+    def __iter__(self):
+        """ Iterate over the index entries, sorted by name """
+
+        for name in sorted(self.index):
+            yield self.index[name]
+
+
+    def get(self, name, opener):
+        """ Return the parsed quiz called 'name'
+
+            If the quiz is not cached, 'opener' is called with the path of
+            the quiz to parse it.
+        """
+
+        if name in self.cache:
+            self.cache[name] = self.cache.pop(name) # Most recently used
+            return self.cache[name]
+
+        info = self.index[name]
+        quiz = opener(info.path)
+
+        self.cache[name] = quiz
+        self.cached_cost += info.cost()
+        self.evict()
+        return quiz
+
+
+    def forget(self, name):
+        """ Drop the parsed quiz called 'name' from the cache """
+
+        if name in self.cache:
+            del self.cache[name]
+            self.cached_cost -= self.index[name].cost()
+
+
+    def evict(self):
+        """ Drop the least recently used quizzes until within budget
+
+            The most recently used quiz is always kept, even if it alone is
+            over budget.
+        """
+
+        while self.cached_cost > self.budget and len(self.cache) > 1:
+            name = next(iter(self.cache))
+            self.forget(name)
@@ -0,0 +1,112 @@
+""" Quiz linter for Quizzer.
+
+    Checks quiz files for problems, reporting every problem found rather
+    than stopping at the first. Many files are checked in parallel, using a
+    process pool, and the problems are reported as JSON (one per line) so
+    that they are easy to process further.
+
+    Checks:
+
+    - syntax: lines that cannot be parsed, multichoice answers that are not
+      one of the choices, and duplicate choice titles (errors).
+    - duplicate-question: the same question asked twice (warning).
+    - empty-question, empty-answer, empty-choice: missing text (warning).
+    - no-questions: a quiz without any questions (error).
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import json
+import sys
+from multiprocessing import Pool, cpu_count
+
+from basequiz import parse_questions
+from answermatch import normalize
+from quizlibrary import QUIZ_EXTENSION, find_files
+
+
+def problem(quiz_file, line_num, severity, code, message):
+    """ Return a dict describing a single problem """
+
+    return {'file': quiz_file, 'line': line_num, 'severity': severity,
+            'code': code, 'message': message}
+
+
+def lint_file(quiz_file):
+    """ Return a list of the problems found in quiz_file """
+
+    errors = []
+    line_nums = []
+    questions = []
+    try:
+        with open(quiz_file) as quiz:
+            for question in parse_questions(quiz, errors, line_nums):
+                questions.append(question)
+    except (IOError, OSError, UnicodeDecodeError) as error:
+        return [problem(quiz_file, None, 'error', 'unreadable', str(error))]
+
+    problems = [problem(quiz_file, line_num, 'error', 'syntax', message)
+                for line_num, message in errors]
+
+    if len(questions) == 0 and len(errors) == 0:
+        problems.append(problem(quiz_file, None, 'error', 'no-questions',
+                                "quiz has no questions"))
+
+    seen = {} # Normalised question: line number
+    for line_num, question in zip(line_nums, questions):
+        if question.question == "":
+            problems.append(problem(quiz_file, line_num, 'warning',
+                                    'empty-question', "question is empty"))
+        if question.answer == "":
+            problems.append(problem(quiz_file, line_num, 'warning',
+                                    'empty-answer', "answer is empty"))
+        if question.sort == 'multichoice':
+            for choice_id, choice in sorted(question.choices.items()):
+                if choice_id == "" or choice == "":
+                    problems.append(problem(quiz_file, line_num, 'warning',
+                                            'empty-choice',
+                                            "choice '{}' is empty".format(
+                                                                choice_id)))
+
+        key = normalize(question.question)
+        if key in seen:
+            problems.append(problem(quiz_file, line_num, 'warning',
+                                    'duplicate-question',
+                                    "question is a duplicate of line {}"
+                                    .format(seen[key])))
+        else:
+            seen[key] = line_num
+
+    problems.sort(key=lambda found: found['line'] or 0)
+    return problems
+
+
+def lint(paths, output=sys.stdout, jobs=None):
+    """ Lint the quizzes in 'paths', writing problems to 'output'
+
+        Returns (files checked, errors, warnings).
+    """
+
+    quiz_files = list(find_files(paths, QUIZ_EXTENSION))
+    if jobs == None:
+        jobs = cpu_count()
+
+    errors = warnings = 0
+    pool = Pool(jobs)
+    try:
+        chunksize = max(1, len(quiz_files) // (jobs * 8))
+        for problems in pool.imap_unordered(lint_file, quiz_files,
+                                            chunksize):
+            for found in problems:
+                if found['severity'] == 'error':
+                    errors += 1
+                else:
+                    warnings += 1
+                output.write(json.dumps(found, sort_keys=True) + "\n")
+    finally:
+        pool.close()
+        pool.join()
+
+    return len(quiz_files), errors, warnings
@@ -0,0 +1,289 @@
+""" Hot reloading of edited quizzes for Quizzer.
+
+    A QuizReloader keeps a digest of the text of each question in a quiz.
+    When the quiz file changes, the new file is split into the same blocks
+    of text, and only blocks with a digest that was not seen before are
+    parsed. The questions are then patched in place:
+
+    - questions with unchanged text keep their position and stats;
+    - changed questions with the same id (by default, a hash of the
+      question and answer) are updated in place, keeping their stats;
+    - other new questions reuse the positions of removed questions, or are
+      added to the end;
+    - any left over removed questions are replaced by the last question.
+
+    The scheduler is told about each change, so nothing is rebuilt (unless
+    only some of the questions are being asked, in which case the scheduler
+    is rebuilt for the remaining ones).
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import hashlib
+import io
+import os
+
+from basequiz import QuizException, parse_questions
+
+
+def is_choice_set(text):
+    """ Return True if the block 'text' defines a choice set """
+
+    line = text.split('\n', 1)[0]
+    return line.startswith('@') and ':' not in line
+
+
+def read_blocks(quiz):
+    """ Yield (line number, text) for each question or choice set in 'quiz'
+
+        A block starts on an unindented line (that is not a comment or part
+        of a continued line), and includes every line up to the next block.
+    """
+
+    block = None
+    start = None
+    continued = False
+    for line_num, line in enumerate(quiz, 1):
+        stripped = line.rstrip('\r\n')
+        if not continued and len(stripped.strip()) != 0 and \
+                not stripped[0].isspace() and stripped[0] != '#':
+            if block != None:
+                yield start, "".join(block)
+            block = []
+            start = line_num
+        if block != None:
+            block.append(line)
+
+        if continued or (len(stripped) != 0 and stripped[0] != '#'):
+            continued = stripped.endswith('\\')
+
+    if block != None:
+        yield start, "".join(block)
+
+
+def digest(text):
+    """ Return a digest of the block of text 'text' """
+
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+def parse_block(text, line_num, errors, choice_sets, ids=None):
+    """ Return the questions in the block 'text', which starts at 'line_num'
+
+        Syntax errors are appended to 'errors' with their line numbers in
+        the whole file. The question ids are kept unique among 'ids'.
+    """
+
+    block_errors = []
+    questions = list(parse_questions(io.StringIO(text), block_errors,
+                                     choice_sets=choice_sets, ids=ids))
+    errors.extend((block_line + line_num - 1, message)
+                  for block_line, message in block_errors)
+    return questions
+
+
+class QuizReloader(object):
+    """ Reloads the questions of a quiz when it's file changes """
+
+    def __init__(self, quiz):
+        """ Initialise the reloader for 'quiz'
+
+            If the quiz file is as it was when the quiz was loaded, the
+            digests of it's questions are found now, so that the first
+            reload only parses what changed; otherwise, the first reload
+            parses the whole file (but still keeps the stats of unchanged
+            questions).
+        """
+
+        self.quiz = quiz
+        self.stat = quiz.loaded_stat
+        self.digests = None # Digest of the text of each question
+        self.set_digest = None # Digest of all the choice set definitions
+
+        if self.current_stat() == self.stat:
+            try:
+                set_blocks, question_blocks = self.read()
+            except QuizException:
+                return
+            if len(question_blocks) == len(quiz.questions):
+                self.set_digest = digest("".join(text for line_num, text
+                                                 in set_blocks))
+                self.digests = [digest(text)
+                                for line_num, text in question_blocks]
+
+
+    def current_stat(self):
+        """ Return the (size, modification time) of the quiz file """
+
+        try:
+            stat = os.stat(self.quiz.name)
+        except (IOError, OSError):
+            return None
+        return stat.st_size, stat.st_mtime
+
+
+    def changed(self):
+        """ Return True if the quiz file has changed since it was read """
+
+        stat = self.current_stat()
+        return stat != None and stat != self.stat
+
+
+    def read(self):
+        """ Return the (choice set blocks, question blocks) of the quiz """
+
+        try:
+            with open(self.quiz.name) as quiz:
+                blocks = list(read_blocks(quiz))
+        except (IOError, OSError, UnicodeDecodeError) as error:
+            raise QuizException("Quiz file '{}' could not be read: {}"
+                                .format(self.quiz.name, error))
+
+        set_blocks = []
+        question_blocks = []
+        for line_num, text in blocks:
+            if is_choice_set(text):
+                set_blocks.append((line_num, text))
+            else:
+                question_blocks.append((line_num, text))
+        return set_blocks, question_blocks
+
+
+    def reload(self):
+        """ Reload the quiz file, patching the quiz's questions in place
+
+            Returns (unchanged, changed, added, removed) question counts.
+            If the new file has errors, or every question being asked (see
+            Quiz.restrict) was removed, a QuizException is raised and the
+            quiz is left as it was.
+        """
+
+        quiz = self.quiz
+        if not hasattr(quiz.questions, 'set_row'):
+            raise QuizException("Lazily loaded quizzes cannot be reloaded!")
+
+        stat = self.current_stat()
+        set_blocks, question_blocks = self.read()
+
+        # Parse the choice sets; if they changed, every question might have
+        # changed too
+        errors = []
+        choice_sets = {}
+        for line_num, text in set_blocks:
+            parse_block(text, line_num, errors, choice_sets)
+        set_digest = digest("".join(text for line_num, text in set_blocks))
+
+        old = {} # Digest: positions of the unchanged questions
+        if self.digests != None and set_digest == self.set_digest:
+            for position, old_digest in enumerate(self.digests):
+                old.setdefault(old_digest, []).append(position)
+
+        # Find the unchanged questions, and parse the rest (keeping the new
+        # ids distinct from the unchanged ones)
+        table = quiz.questions
+        kept = {} # Position: digest
+        changed_blocks = [] # (line number, text, digest)
+        for line_num, text in question_blocks:
+            block_digest = digest(text)
+            if len(old.get(block_digest, ())) != 0:
+                kept[old[block_digest].pop()] = block_digest
+            else:
+                changed_blocks.append((line_num, text, block_digest))
+
+        ids = set(table.ids[position] for position in kept)
+        parsed = [] # (digest, question)
+        for line_num, text, block_digest in changed_blocks:
+            for question in parse_block(text, line_num, errors, choice_sets,
+                                        ids):
+                parsed.append((block_digest, question))
+
+        if len(errors) != 0:
+            errors.sort()
+            raise QuizException("Quiz file '{}' has {} error(s)".format(
+                                                quiz.name, len(errors)),
+                                errors)
+        if len(kept) + len(parsed) == 0:
+            raise QuizException("Quiz file '{}' has no questions!".format(
+                                                                quiz.name))
+        if quiz.active != None:
+            # Questions are only still asked if unchanged or changed in place
+            parsed_ids = set(question.id for block_digest, question in parsed)
+            if not any(position in kept or table.ids[position] in parsed_ids
+                       for position in quiz.active):
+                raise QuizException("Every question being asked was removed "
+                                    "from quiz file '{}'!".format(quiz.name))
+
+        # Everything checks out; patch the questions
+        scheduler = quiz._scheduler
+        if quiz.active != None:
+            active = set(quiz.active)
+            scheduler = None # Rebuilt below, rather than patched
+
+        removed = [position for position in range(len(table))
+                   if position not in kept]
+        by_id = dict((table.ids[position], position)
+                     for position in removed)
+
+        changed = 0
+        new = []
+        for block_digest, question in parsed:
+            position = by_id.pop(question.id, None)
+            if position == None:
+                new.append((block_digest, question))
+                continue
+            table.set_row(position, question.question, question.answer,
+                          question.sort, question.choices,
+                          table.correct[position], table.wrong[position],
+                          question.id)
+            kept[position] = block_digest
+            changed += 1
+            quiz.update_question(position)
+
+        free = sorted((position for position in removed
+                       if position not in kept), reverse=True)
+        gone = len(free) # Removed, rather than changed
+        for block_digest, question in new:
+            if len(free) != 0:
+                position = free.pop()
+                table.set_row(position, question.question, question.answer,
+                              question.sort, question.choices,
+                              question_id=question.id)
+                if scheduler != None:
+                    scheduler.update(position)
+                if quiz.active != None:
+                    active.discard(position) # Not in the filtered questions
+            else:
+                position = table.append(question.question, question.answer,
+                                        question.sort, question.choices,
+                                        question_id=question.id)
+                if scheduler != None:
+                    scheduler.add(position)
+            kept[position] = block_digest
+
+        for position in free: # Highest first
+            moved = table.remove(position)
+            if position != moved:
+                kept[position] = kept.pop(moved)
+            if scheduler != None:
+                scheduler.remove(position, moved)
+            if quiz.active != None:
+                active.discard(position)
+                if moved in active:
+                    active.discard(moved)
+                    active.add(position)
+
+        if quiz.active != None:
+            quiz.restrict(sorted(active))
+
+        # The search, completion and id indexes (and cache) are out of date
+        quiz._search = None
+        quiz._completions = None
+        quiz._ids = None
+        quiz._cache_digest = None
+
+        self.stat = stat
+        self.set_digest = set_digest
+        self.digests = [kept[position] for position in range(len(table))]
+        return len(table) - changed - len(new), changed, len(new), gone
@@ -0,0 +1,102 @@
+""" Full text search for Quizzer.
+
+    An inverted index maps each word in a quiz's questions and choices to
+    the (sorted) positions of the questions containing it, so a query only
+    touches the questions that match rather than scanning the whole quiz.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """ Return the list of (lower case) words in 'text' """
+
+    return WORD.findall(text.lower())
+
+
+def contains(postings, position):
+    """ Return True if the sorted array 'postings' contains 'position' """
+
+    i = bisect_left(postings, position)
+    return i < len(postings) and postings[i] == position
+
+
+class SearchIndex(object):
+    """ An inverted index over the questions of a quiz """
+
+    def __init__(self, postings):
+        """ Initialise the index from a dict of word: position array """
+
+        self.postings = postings
+
+
+    def data(self):
+        """ Return the postings as plain data (a dict of word: bytes) """
+
+        return dict((word, positions.tobytes())
+                    for word, positions in self.postings.items())
+
+
+    @classmethod
+    def from_data(cls, data):
+        """ Return the index for postings saved with data() """
+
+        postings = {}
+        for word, positions in data.items():
+            postings[word] = array('l')
+            postings[word].frombytes(positions)
+        return cls(postings)
+
+
+    @classmethod
+    def build(cls, questions):
+        """ Build the index for 'questions', an iterable of Questions in
+            order of position
+        """
+
+        postings = {}
+        for question in questions:
+            position = question.position
+            text = question.question
+            if question.choices != None:
+                text = " ".join([text] + list(question.choices.values()))
+            for word in set(tokenize(text)):
+                if word not in postings:
+                    postings[word] = array('l')
+                postings[word].append(position)
+        return cls(postings)
+
+
+    def search(self, query):
+        """ Return the sorted positions of questions matching every word
+
+            The posting lists are intersected smallest first, so the cost
+            depends on the rarest word rather than the size of the quiz.
+        """
+
+        words = set(tokenize(query))
+        if len(words) == 0:
+            return []
+
+        lists = []
+        for word in words:
+            if word not in self.postings:
+                return []
+            lists.append(self.postings[word])
+        lists.sort(key=len)
+
+        matches = list(lists[0])
+        for postings in lists[1:]:
+            matches = [position for position in matches
+                       if contains(postings, position)]
+            if len(matches) == 0:
+                break
+        return matches
@@ -0,0 +1,293 @@
+""" Quizzer server.
+
+    Serves a quiz to many users at once over a simple line based TCP
+    protocol, using asyncio so that each connection costs a few objects
+    rather than a thread.
+
+    All sessions share a single parsed quiz; each session keeps it's own
+    stats in a QuizSession, which only stores the questions that session has
+    actually answered.
+
+    Protocol (all lines are UTF-8 text):
+
+    - The server sends a question as "QUESTION <question>", followed by one
+      "CHOICE <id>: <choice>" line per choice for multichoice questions, and
+      then "ANSWER?".
+    - The client replies with a single line; either an answer, or one of the
+      commands "quit" or "help".
+    - The server replies with "CORRECT <answer>" or "WRONG <answer>", and
+      then sends the next question.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import asyncio
+from random import random, randrange
+
+from basequiz import BaseQuiz, Quiz, QuizException, question_weight
+from scheduler import WeightIndex
+
+HELP = ["HELP Answer each question with a single line.",
+        "HELP For multichoice questions, answer with the choice id.",
+        "HELP Send 'quit' to disconnect."]
+
+
+class QuizSession(object):
+    """ One user's view of a shared quiz
+
+        The session acts like a Quiz for BaseQuiz, but keeps it's stats to
+        itself instead of storing them on the shared questions. Only the
+        questions the user has answered are tracked, so a session costs
+        memory in proportion to the answers given, not the size of the quiz.
+        If the quiz is restricted to some questions (see Quiz.restrict),
+        only those are asked.
+    """
+
+    def __init__(self, quiz):
+        """ Initialise a new session on the shared 'quiz' """
+
+        self.quiz = quiz
+        self.questions = quiz.questions
+        self.total_questions = 0
+        self.skipped = [] # Shared quizzes are never lazy
+
+        # Positions of the questions to ask
+        self.population = quiz.active
+        if self.population == None:
+            self.population = range(len(quiz.questions))
+
+        # Stats for the answered questions
+        self.slots = {} # Question position: slot
+        self.positions = [] # Slot: question position
+        self.correct = [] # Slot: correct answers
+        self.wrong = [] # Slot: wrong answers
+        self.index = WeightIndex([]) # Slot: weight
+
+
+    def base_weight(self):
+        """ Return the weight of a question that has not been answered """
+
+        return question_weight(0, 0, self.total_questions)
+
+
+    def get_question(self):
+        """ Return a random question, weighted by this session's stats
+
+            Answered questions are sampled from the weight index; the
+            remaining questions all have the same weight, so they are
+            sampled uniformly (by rejecting answered questions).
+        """
+
+        self.total_questions += 1
+
+        population = self.population
+        answered = self.index.total()
+        unanswered = max(self.base_weight(), 0) * \
+                     (len(population) - len(self.positions))
+        total = answered + unanswered
+        if total <= 0:
+            return self.questions[population[randrange(len(population))]]
+
+        value = random() * total
+        if value < answered:
+            slot = self.index.find(value)
+            if slot < len(self.positions):
+                return self.questions[self.positions[slot]]
+
+        while True:
+            position = population[randrange(len(population))]
+            if position not in self.slots:
+                return self.questions[position]
+
+
+    def check_answer(self, question, answer):
+        """ Return True if 'answer' is a correct answer to 'question' """
+
+        return self.quiz.check_answer(question, answer)
+
+
+    def record_answer(self, question, correct):
+        """ Record an answer to 'question' in this session's stats """
+
+        position = question.position
+        if position not in self.slots:
+            self.slots[position] = len(self.positions)
+            self.positions.append(position)
+            self.correct.append(0)
+            self.wrong.append(0)
+            self.index.append(self.base_weight())
+
+        slot = self.slots[position]
+        if correct:
+            self.correct[slot] += 1
+        else:
+            self.wrong[slot] += 1
+        self.index.update(slot, question_weight(self.correct[slot],
+                                                self.wrong[slot],
+                                                self.total_questions))
+
+
+class Session(BaseQuiz):
+    """ A quiz for a single connection """
+
+    def __init__(self, quiz, writer):
+        """ Initialise a session on the shared 'quiz', writing to 'writer' """
+
+        BaseQuiz.__init__(self)
+        self.quiz = QuizSession(quiz)
+        self.writer = writer
+
+
+    def send(self, *lines):
+        """ Queue 'lines' to be sent to the client """
+
+        self.writer.write("".join(line + "\n" for line in lines)
+                              .encode('utf-8'))
+
+
+    def handle_line(self, line):
+        """ Handle a line from the client """
+
+        if line.lower() == "quit":
+            self.quit()
+        elif line.lower() == "help":
+            self.send(*HELP)
+            self.send("ANSWER?")
+        elif self.get_state() == self.ANSWER:
+            self.answer = line
+            self.accept_answer()
+            self.next_question()
+
+
+    # UI related stuff...
+
+    def cancel_quiz(self):
+        """ Sessions have a single quiz, so cancelling just quits """
+
+        self.quit()
+
+
+    def load_quiz(self):
+        """ Sessions are given their quiz """
+
+        raise NotImplementedError("Sessions are given their quiz!")
+
+
+    def display_question(self):
+        """ Send the current question """
+
+        self.send("QUESTION " + self.question.question)
+        if self.question.sort == 'multichoice':
+            self.send(*["CHOICE {}: {}".format(choice_id, choice)
+                        for choice_id, choice
+                        in sorted(self.question.choices.items())])
+        self.send("ANSWER?")
+
+
+    def set_answer_response(self, correct_answer, correct):
+        """ Send the response to the answer """
+
+        if correct:
+            self.send("CORRECT " + correct_answer)
+        else:
+            self.send("WRONG " + correct_answer)
+
+
+class QuizServer(object):
+    """ Serves a single shared quiz to many connections """
+
+    def __init__(self, quiz):
+        """ Initialise the server for 'quiz' """
+
+        self.quiz = quiz
+        self.sessions = 0 # Currently connected sessions
+
+
+    async def handle_connection(self, reader, writer):
+        """ Run a session for a new connection """
+
+        self.sessions += 1
+        session = Session(self.quiz, writer)
+        try:
+            session.next_question()
+            await writer.drain()
+            while session.running:
+                line = await reader.readline()
+                if len(line) == 0:
+                    break # Disconnected
+                session.handle_line(line.decode('utf-8', 'replace').strip())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+
+    def start(self, host, port, backlog=1024):
+        """ Return a coroutine starting the server on host:port """
+
+        return asyncio.start_server(self.handle_connection, host, port,
+                                    backlog=backlog)
+
+
+def serve(quiz_file, host='localhost', port=8642, tolerance=0,
+          question_filter=None):
+    """ Serve 'quiz_file' until interrupted
+
+        Answers are allowed 'tolerance' typos, and if 'question_filter' is
+        given only the questions matching it are asked (see Quiz.search).
+    """
+
+    quiz = Quiz(quiz_file, tolerance=tolerance)
+    if question_filter != None:
+        matches = quiz.search(question_filter)
+        if len(matches) == 0:
+            raise QuizException("No questions match '{}'!".format(
+                                                        question_filter))
+        quiz.restrict(matches)
+
+    server = QuizServer(quiz)
+    loop = asyncio.new_event_loop()
+    listener = loop.run_until_complete(server.start(host, port))
+    print("Serving {} on {}:{}".format(quiz_file, host, port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        loop.run_until_complete(listener.wait_closed())
+        loop.close()
+
+
+async def client(host, port, answers):
+    """ A simple client that answers 'answers' questions with the first choice
+
+        Returns the number of answers that were correct.
+    """
+
+    reader, writer = await asyncio.open_connection(host, port)
+    correct = 0
+    answered = 0
+    first_choice = ""
+    while answered < answers:
+        line = (await reader.readline()).decode('utf-8')
+        if len(line) == 0:
+            break
+        if line.startswith("CHOICE ") and first_choice == "":
+            first_choice = line[len("CHOICE "):].split(':')[0]
+        elif line.startswith("ANSWER?"):
+            writer.write((first_choice + "\n").encode('utf-8'))
+            first_choice = ""
+        elif line.startswith("CORRECT "):
+            correct += 1
+            answered += 1
+        elif line.startswith("WRONG "):
+            answered += 1
+    writer.write(b"quit\n")
+    await writer.drain()
+    writer.close()
+    return correct
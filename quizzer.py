@@ -20,7 +20,6 @@
       ordered.
     - Psuedo randomization of questions - done?
     - Images
-    - Letting sets of possible answers being allocated seperatly from questions
     - Adding more question types
     - Framebuffer UI
     - Checking that the given answer is valid for multichoice questions
@@ -67,16 +66,6 @@
 
 """
 
-VERSION=0.1
-
-# Try to import a tk quizzer
-try:
-    from tkquiz import TkQuiz
-except ImportError:
-    # Failed to import tk!
-    # This is so that the program falls back to the CLI interface
-    TkQuiz = None
-
 # Try to correct python 3/2 differences
 import sys
 if sys.version_info.major >= 3:
@@ -84,16 +73,25 @@ if sys.version_info.major >= 3:
 else:
     get_input = raw_input
 
-from random import shuffle
+import random
+
+# Tab completion, where available
+try:
+    import readline
+except ImportError:
+    readline = None
 
 # For CLI argument support
 import argparse
 
 # Quizzer stuff
+# Anything not needed to show the first question (including the tk
+# interface) is imported when it is used, to keep startup fast
 from basequiz import BaseQuiz, \
                      Quiz, \
                      Question, \
                      QuizException
+from scheduler import SCHEDULERS
 
 # Define some colours (this is probably not portable...)
 RESET   = '\033[0m'
@@ -122,7 +120,6 @@ class CLIQuiz(BaseQuiz):
     
         Features to add:
 
-        - Tab completion
         - Pictures replaced with ascii art
         - Better multichoice:
           - Randomly order the possible answers
@@ -130,6 +127,18 @@ class CLIQuiz(BaseQuiz):
     """
 
     
+    def __init__(self, *args, **kargs):
+        """ Initialise self, and set up tab completion if possible """
+
+        BaseQuiz.__init__(self, *args, **kargs)
+
+        self.completions = [] # Completions for the current input
+        if readline != None:
+            readline.set_completer_delims("")
+            readline.set_completer(self.complete)
+            readline.parse_and_bind("tab: complete")
+
+
     # CLI control functions
                
 
@@ -139,6 +148,9 @@ class CLIQuiz(BaseQuiz):
             This involves getting the state and acting as required
         """
 
+        if self.question != None:
+            self.display_question() # Resumed part way through
+
         while self.running:
             state = self.get_state()
             
@@ -167,10 +179,21 @@ class CLIQuiz(BaseQuiz):
 
         result = None # Result
 
-        value = get_input(message + ": ") # Get input
+        try:
+            value = get_input(message + ": ") # Get input
+        except EOFError:
+            # Out of input (eg, when scripted); quit
+            print("")
+            self.quit()
+            return None
 
         #TODO: Implement other commands (?)
-        if value.lower() == "quit":
+        if value.lower().startswith("search ") and self.quiz != None:
+            # Search the current quiz
+            self.search(value[len("search "):])
+            if self.question != None:
+                self.display_question() # Show the question again
+        elif value.lower() == "quit":
             # Quit quizzing
             self.quit()
         elif value.lower() == "help":
@@ -179,12 +202,28 @@ class CLIQuiz(BaseQuiz):
         elif value.lower() == "cancel":
             # Cancel!
             self.cancel_quiz()
+        elif value.lower() == "list" and self.library != None:
+            # List the quizzes in the library
+            self.list_quizzes()
         else:   # Return the user input
             result = value
 
         return result
 
     
+    def complete(self, text, state):
+        """ Return the state'th completion of 'text', for readline """
+
+        if state == 0:
+            self.completions = []
+            if self.get_state() == self.ANSWER and \
+                    self.question.sort == 'prompt':
+                self.completions = self.quiz.complete(text)
+        if state < len(self.completions):
+            return self.completions[state]
+        return None
+
+
     # UI properties
  
 
@@ -215,9 +254,37 @@ Commands:
 """+HIGH+"quit"+RESET+"""    - exit the quiz.
 """+HIGH+"cancel"+RESET+"""  - cancel the current quiz.
 """+HIGH+"help"+RESET+"""    - print this message.
+"""+HIGH+"list"+RESET+"""    - list the quizzes in the library (with
+          --library).
+"""+HIGH+"search"+RESET+"""  - search the current quiz, eg 'search flashing
+          lights'.
 """)
 
 
+    def search(self, query, limit=20):
+        """ Print out the questions in the current quiz matching 'query' """
+
+        try:
+            matches = self.quiz.search(query)
+        except QuizException as error:
+            print(WRONG+"Search failed due to {}".format(error)+RESET)
+            return
+        for position in matches[:limit]:
+            print(HIGH+"*"+RESET+" "+self.quiz.questions[position].question)
+        if len(matches) > limit:
+            print("... and {} more".format(len(matches) - limit))
+        print("{} question(s) match".format(len(matches)))
+
+
+    def list_quizzes(self):
+        """ Print out the quizzes in the library """
+
+        self.library.scan()
+        for info in self.library:
+            print((HIGH+"{}"+RESET+" - {} ({} questions)").format(
+                        info.name, info.title, info.questions))
+
+
     def load_quiz(self):
         """ Load a new quiz from the user """
 
@@ -225,7 +292,7 @@ Commands:
 
         if user_input != None:
             try:
-                self.quiz = Quiz(user_input)
+                self.quiz = self.open_quiz(user_input)
             except QuizException as error:
                 print(("Quiz '{}' not loaded due to "+RED+"{}!"+RESET).format(
                                                user_input, error))
@@ -246,14 +313,33 @@ Commands:
             print(PROMPT+self.question.question+RESET)
             pairs = [HIGH + "{}:".format(choice) + RESET \
                     + " {}".format(self.question.choices[choice])
-                     for choice in self.question.choices]
-            shuffle(pairs)
+                     for choice in self.choice_order(self.question)]
             choices = "    \n".join(pairs)
             print(choices)
         else:
             raise ValueError("Question sort '{}' not recognized!".format(sort))
 
 
+    def exam_finished(self):
+        """ Print out the exam result, and finish """
+
+        print(("Exam finished: "+HIGH+"{}"+RESET+" of {} correct.").format(
+                    self.paper.correct, len(self.paper)))
+        BaseQuiz.exam_finished(self)
+
+
+    def report_reload(self, message):
+        """ Print out a message about reloading the quiz """
+
+        print(HIGH+message+RESET)
+
+
+    def report_skipped(self, message):
+        """ Print out a message about a question that could not be asked """
+
+        print(WRONG+message+RESET)
+
+
     def set_answer_response(self, correct_answer, correct):
         """ Print out the response to the answer """
 
@@ -265,35 +351,313 @@ Commands:
                 correct_answer))
 
 
-def cli(tk):
+def compile_quizzes(quiz_files):
+    """ Build the compiled caches for quiz_files
+
+        Returns an exit status; non-zero if any quiz failed to compile.
+    """
+
+    status = 0
+    for quiz_file in quiz_files:
+        try:
+            quiz = Quiz(quiz_file)
+        except QuizException as error:
+            print(("Quiz '{}' not compiled due to "+RED+"{}!"+RESET).format(
+                                           quiz_file, error))
+            status = 1
+        else:
+            if quiz.is_cached():
+                print("Quiz {} compiled".format(quiz_file))
+            else:
+                print(("Quiz '{}' not compiled: "+RED+"the cache could not " +
+                       "be written!"+RESET).format(quiz_file))
+                status = 1
+    return status
+
+
+def report_profile(profiler, mode, output=None):
+    """ Print (or save to output) the results of profiling """
+
+    profiler.disable()
+
+    if mode == "summary":
+        report = profiler.summary() + "\n"
+        if output != None:
+            with open(output, 'w') as report_file:
+                report_file.write(report)
+        else:
+            sys.stderr.write(report)
+    else:
+        if output != None:
+            profiler.dump_stats(output)
+        else:
+            import pstats
+            pstats.Stats(profiler, stream=sys.stderr) \
+                  .sort_stats('cumulative').print_stats(25)
+
+
+def cli():
     """ Handle the CLI interface to Quizzer """
 
     parser = argparse.ArgumentParser(usage="quizzer application, written in python")
 
-    parser.add_argument("--interface", default="cli", help="One of tk, or cli")
+    parser.add_argument("--interface", default="cli", choices=["cli", "tk"],
+                        help="The interface to use")
     parser.add_argument("--quiz", default=None, help="Quiz file to load")
+    parser.add_argument("--compile", nargs='+', default=None, metavar="QUIZ",
+                        help="Build the compiled caches for the given " +
+                             "quizzes and exit")
+    parser.add_argument("--stats", default=None, metavar="FILE",
+                        help="Database to save question stats in between " +
+                             "sessions")
+    parser.add_argument("--library", default=None, metavar="DIR",
+                        help="Directory of quizzes to load by name")
+    parser.add_argument("--library-budget", default=64, type=int,
+                        metavar="MB",
+                        help="Memory to use for caching parsed quizzes " +
+                             "from the library")
+    parser.add_argument("--filter", default=None, metavar="TERMS",
+                        help="Only ask questions containing all these words")
+    parser.add_argument("--tolerance", default=0, type=int,
+                        help="Number of typos to allow in typed answers")
+    parser.add_argument("--lazy", action="store_true",
+                        help="Only parse questions as they are needed " +
+                             "(for very large quizzes)")
+    parser.add_argument("--watch", nargs='?', default=None, const=1.0,
+                        type=float, metavar="SECONDS",
+                        help="Reload the quiz when it's file is edited, " +
+                             "checking at most every SECONDS (default 1)")
+    parser.add_argument("--checkpoint", default=None, metavar="FILE",
+                        help="Save the session to FILE as it goes")
+    parser.add_argument("--resume", action="store_true",
+                        help="Carry on the session saved with --checkpoint")
+    parser.add_argument("--events", default=None, metavar="FILE",
+                        help="Log every answer to FILE, for --analyze")
+    parser.add_argument("--exam", default=None, type=int, metavar="N",
+                        help="Set an exam of N distinct questions")
+    parser.add_argument("--seed", default=None, type=int,
+                        help="Seed for drawing the exam paper, so that " +
+                             "it can be set again")
+    parser.add_argument("--scheduler", default="weighted",
+                        choices=sorted(SCHEDULERS),
+                        help="How to pick the next question")
+
+    parser.add_argument("--lint", nargs='+', default=None, metavar="PATH",
+                        help="Check the quizzes in the given files or " +
+                             "directories, print the problems as JSON " +
+                             "and exit")
+    parser.add_argument("--analyze", nargs='+', default=None, metavar="LOG",
+                        help="Report the hardest questions from the given " +
+                             "answer logs (or directories) as JSON and exit")
+    parser.add_argument("--grade", default=None, metavar="SHEETS",
+                        help="Grade the answer sheets in SHEETS (JSON lines " +
+                             "or CSV) against the quiz, print the results " +
+                             "as JSON and exit")
+    parser.add_argument("--grade-questions", default=None, metavar="FILE",
+                        help="Save how each question did in --grade to FILE")
+    parser.add_argument("--simulate", default=None, type=int,
+                        metavar="LEARNERS",
+                        help="Simulate this many learners answering the " +
+                             "quiz and print the results")
+    parser.add_argument("--simulate-questions", default=1000, type=int,
+                        metavar="N",
+                        help="Questions for each simulated learner to answer")
+    parser.add_argument("--accuracy", default=0.5, type=float,
+                        help="Initial accuracy of simulated learners")
+    parser.add_argument("--learning-rate", default=0.2, type=float,
+                        help="How quickly simulated learners improve")
+    parser.add_argument("--diagnose", default=None, type=int,
+                        metavar="DRAWS",
+                        help="Draw this many questions (after giving them " +
+                             "random stats), check they follow the " +
+                             "weights and print the results")
+    parser.add_argument("--serve", default=None, metavar="[HOST:]PORT",
+                        help="Serve the quiz to many users over TCP")
+    parser.add_argument("--profile", nargs='?', default=None,
+                        const="summary", choices=["summary", "cprofile"],
+                        help="Profile the hot paths, and print a summary " +
+                             "(or full cProfile output) on quit")
+    parser.add_argument("--profile-output", default=None, metavar="FILE",
+                        help="Save the profile to FILE instead of printing it")
+    parser.add_argument("--jobs", default=None, type=int,
+                        help="Number of processes to use")
 
     args = parser.parse_args()
 
-    interface = args.interface
-
-    if interface == "tk":
-        if tk == None:
-            parser.error("tk cannot be imported!")
+    if args.compile != None:
+        sys.exit(compile_quizzes(args.compile))
+
+    if args.lint != None:
+        from quizlint import lint
+        files, errors, warnings = lint(args.lint, jobs=args.jobs)
+        sys.stderr.write("{} file(s) checked: {} error(s), {} warning(s)\n"
+                         .format(files, errors, warnings))
+        sys.exit(1 if errors != 0 else 0)
+
+    if args.analyze != None:
+        from analytics import analyze
+        events, bad = analyze(args.analyze, jobs=args.jobs)
+        sys.stderr.write("{} event(s) read, {} unreadable line(s)\n"
+                         .format(events, bad))
+        return
+
+    if args.grade != None:
+        if args.quiz == None:
+            parser.error("--grade needs a --quiz to grade against!")
+        from grading import grade
+        question_output = None
+        if args.grade_questions != None:
+            question_output = open(args.grade_questions, 'w')
         try:
-            quiz_ui = TkQuiz(args.quiz)
-        except tk._tkinter.TclError:
-            print("No X detected; falling back to a CLI quiz!")
-            interface = "cli"
-    if interface == "cli":
-        quiz_ui = CLIQuiz(args.quiz)
-    else:
-        parser.error("Unknown interface: {}".format(interface))
+            graded, stats = grade(args.quiz, args.grade, sys.stdout,
+                                  question_output, args.tolerance, args.jobs)
+        except QuizException as error:
+            parser.error(str(error))
+        finally:
+            if question_output != None:
+                question_output.close()
+        sys.stderr.write("{} sheet(s) graded, {} question(s) answered\n"
+                         .format(graded, len(stats)))
+        return
+
+    if args.simulate != None:
+        if args.quiz == None:
+            parser.error("--simulate needs a --quiz to simulate!")
+        if args.simulate < 1 or args.simulate_questions < 1:
+            parser.error("--simulate needs at least one learner and one " +
+                         "question!")
+        from simulate import simulate
+        try:
+            results = simulate(args.quiz, args.simulate,
+                               args.simulate_questions, args.accuracy,
+                               args.learning_rate, args.scheduler, args.jobs)
+        except QuizException as error:
+            parser.error(str(error))
+        import json
+        print(json.dumps(results, indent=4, sort_keys=True))
+        return
+
+    if args.diagnose != None:
+        if args.quiz == None:
+            parser.error("--diagnose needs a --quiz to draw from!")
+        import json
+        from diagnostics import SPREAD, WEIGHTED, diagnose, randomize_stats
+        if args.scheduler not in WEIGHTED:
+            parser.error("--diagnose only checks weight-based schedulers " +
+                         "({})!".format(", ".join(WEIGHTED)))
+        if args.diagnose < 1:
+            parser.error("--diagnose needs at least one draw!")
+        seed = args.seed if args.seed != None else 0
+        random.seed(seed)
+        try:
+            quiz = Quiz(args.quiz, scheduler=args.scheduler)
+        except QuizException as error:
+            parser.error(str(error))
+        randomize_stats(quiz, SPREAD, seed)
+        results = diagnose(quiz, args.diagnose)
+        print(json.dumps(results, indent=4, sort_keys=True))
+        sys.exit(0 if results['passed'] else 1)
+
+    if args.serve != None:
+        if args.quiz == None:
+            parser.error("--serve needs a --quiz to serve!")
+        host, colon, port = args.serve.rpartition(':')
+        if not port.isdigit():
+            parser.error("Invalid port: {}".format(port))
+        if args.scheduler != 'weighted':
+            # Each session picks questions by it's own stats, by weight
+            parser.error("--serve only supports the weighted scheduler!")
+        from quizserver import serve
+        try:
+            serve(args.quiz, host or 'localhost', int(port), args.tolerance,
+                  args.filter)
+        except QuizException as error:
+            parser.error(str(error))
+        return
+
+    interface = CLIQuiz
+    if args.interface == "tk":
+        try:
+            import tkquiz
+        except ImportError:
+            parser.error("tk cannot be imported!")
+        interface = tkquiz.TkQuiz
+
+    stats = None
+    if args.stats != None:
+        from statstore import StatsStore
+        stats = StatsStore(args.stats)
+
+    checkpoint = None
+    if args.checkpoint != None:
+        from checkpoint import Checkpoint
+        checkpoint = Checkpoint(args.checkpoint)
+    elif args.resume:
+        parser.error("--resume needs a --checkpoint to resume from!")
+
+    seed = args.seed
+    if args.exam != None and seed == None:
+        seed = random.randrange(2 ** 32)
+        print("Exam seed: {}".format(seed))
+
+    events = None
+    if args.events != None:
+        from eventlog import EventLog
+        events = EventLog(args.events)
+
+    library = None
+    if args.library != None:
+        from quizlibrary import QuizLibrary
+        library = QuizLibrary(args.library,
+                              budget=args.library_budget * 1024 * 1024)
+
+    # Start profiling before anything is loaded
+    profiler = None
+    if args.profile == "summary":
+        from profiler import Profiler
+        profiler = Profiler()
+        targets = [(Quiz, '__init__'), (Quiz, 'get_question'),
+                   (BaseQuiz, 'accept_answer'),
+                   (interface, 'display_question')]
+        profiler.enable(targets)
+    elif args.profile == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    options = dict(stats=stats, scheduler=args.scheduler, library=library,
+                   question_filter=args.filter, tolerance=args.tolerance,
+                   lazy=args.lazy, checkpoint=checkpoint, resume=args.resume,
+                   events=events, watch=args.watch, exam=args.exam,
+                   seed=seed)
+    try:
+        if interface != CLIQuiz:
+            try:
+                quiz_ui = interface(args.quiz, **options)
+            except tkquiz.tk.TclError:
+                print("No X detected; falling back to a CLI quiz!")
+                interface = CLIQuiz
+        if interface == CLIQuiz:
+            quiz_ui = CLIQuiz(args.quiz, **options)
+    except QuizException as error:
+        # The quiz given with --quiz could not be opened
+        parser.error(str(error))
 
     quiz_ui.run()
 
+    # The tk interface can be closed without quitting, so flush here too
+    if checkpoint != None:
+        checkpoint.flush()
+    if stats != None:
+        stats.close()
+    if events != None:
+        events.close()
+
+    if args.profile != None:
+        report_profile(profiler, args.profile, args.profile_output)
+
 
 if __name__ == "__main__":
     # Call the CLI function
-    cli(TkQuiz)
+    cli()
 
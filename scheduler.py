@@ -0,0 +1,384 @@
+""" Question schedulers for Quizzer.
+
+    A scheduler decides which question a quiz asks next. Each scheduler is
+    built for a single quiz, and is told whenever the stats of one of the
+    quiz's questions change.
+
+    Schedulers:
+
+    - weighted: pick questions at random, weighted by Question.weight().
+    - leitner: Leitner boxes; each question is due again after a number of
+      draws that doubles each time it is answered correctly, and resets
+      when it is answered wrongly.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+from heapq import heappush, heappop
+from random import random, randrange
+
+
+class WeightIndex(object):
+    """ A Fenwick (binary indexed) tree over question weights
+
+        Supports weighted sampling and weight updates in O(log n).
+        Negative weights are clamped to zero; if every weight is zero, the
+        sampling falls back to a uniform choice.
+    """
+
+    def __init__(self, weights):
+        """ Build the tree from the list of weights in O(n) """
+
+        self.size = len(weights)
+        self.weights = [max(weight, 0) for weight in weights]
+        self.tree = [0] + self.weights
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+        # The highest power of two not greater than the size, for searching
+        self.top = 1
+        while self.top * 2 <= self.size:
+            self.top *= 2
+
+
+    def total(self):
+        """ Return the sum of all weights """
+
+        total = 0
+        i = self.size
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+    def update(self, position, weight):
+        """ Set the weight at 'position' to 'weight' """
+
+        weight = max(weight, 0)
+        delta = weight - self.weights[position]
+        self.weights[position] = weight
+        i = position + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+
+    def append(self, weight):
+        """ Add a new position with 'weight' to the end, in O(log n) """
+
+        weight = max(weight, 0)
+        self.size += 1
+        self.weights.append(weight)
+
+        # The new node covers the positions (size - lowbit(size), size]
+        node = weight
+        i = self.size - 1
+        stop = self.size - (self.size & -self.size)
+        while i > stop:
+            node += self.tree[i]
+            i -= i & -i
+        self.tree.append(node)
+
+        if self.top * 2 <= self.size:
+            self.top *= 2
+
+
+    def find(self, value):
+        """ Return the first position where the prefix sum exceeds value """
+
+        position = 0
+        step = self.top
+        while step > 0:
+            next_position = position + step
+            if next_position <= self.size and \
+                    self.tree[next_position] <= value:
+                position = next_position
+                value -= self.tree[next_position]
+            step //= 2
+        return position
+
+
+    def pop(self):
+        """ Remove the last position, in O(1) """
+
+        # No node covers a position after it's own, so the last node can
+        # simply be dropped
+        self.size -= 1
+        self.weights.pop()
+        self.tree.pop()
+        while self.top > max(self.size, 1):
+            self.top //= 2
+
+
+    def sample(self):
+        """ Return a position, chosen with probability proportional to it's
+            weight
+        """
+
+        total = self.total()
+        if total <= 0:
+            return randrange(self.size)
+
+        position = self.find(random() * total)
+        # Guard against floating point drift when random() * total lands on
+        # the very end of the range
+        while position >= self.size or self.weights[position] <= 0:
+            position = self.find(random() * total)
+        return position
+
+
+class Scheduler(object):
+    """ Base scheduler
+
+        This cannot be used on it's own as it picks no questions...
+    """
+
+    def __init__(self, quiz):
+        """ Initialise the scheduler for 'quiz'
+
+            If the quiz is restricted to some questions, self.positions is
+            the list of their positions; otherwise it is None.
+        """
+
+        self.quiz = quiz
+        if quiz.active != None:
+            self.positions = list(quiz.active)
+        else:
+            self.positions = None
+
+
+    def next_question(self):
+        """ Return the position of the next question to ask """
+
+        raise NotImplementedError("Scheduler is only a template!")
+
+
+    def update(self, position):
+        """ Update after the stats of the question at 'position' change """
+
+        raise NotImplementedError("Scheduler is only a template!")
+
+
+    def replay(self, position):
+        """ Redo the draw of the question at 'position'
+
+            This is used when restoring a session, to bring the scheduler up
+            to date with the questions asked since it was saved. Schedulers
+            that keep no state about past draws have nothing to redo.
+        """
+
+        pass
+
+
+    def add(self, position):
+        """ Start asking the new question at 'position' (the last)
+
+            Like remove, this is only used when every question is asked.
+        """
+
+        raise NotImplementedError("Scheduler is only a template!")
+
+
+    def remove(self, position, moved):
+        """ Stop asking the removed question at 'position'
+
+            The question that was at 'moved' (the last position) has been
+            moved into it's place.
+        """
+
+        raise NotImplementedError("Scheduler is only a template!")
+
+
+    def __getstate__(self):
+        """ Return the state to pickle, without the quiz
+
+            The quiz must be set again after unpickling.
+        """
+
+        state = self.__dict__.copy()
+        del state['quiz']
+        return state
+
+
+class WeightedScheduler(Scheduler):
+    """ Pick questions at random, weighted by Question.weight() """
+
+    def __init__(self, quiz):
+        """ Build the weight index for 'quiz' """
+
+        Scheduler.__init__(self, quiz)
+
+        weights = quiz.questions.weights(quiz.total_questions)
+        self.slots = None # Question position: index slot, if restricted
+        if self.positions != None:
+            self.slots = dict((position, slot)
+                              for slot, position in enumerate(self.positions))
+            weights = [weights[position] for position in self.positions]
+        self.index = WeightIndex(weights)
+
+
+    def next_question(self):
+        """ Return the position of a weighted random question """
+
+        slot = self.index.sample()
+        if self.positions != None:
+            return self.positions[slot]
+        return slot
+
+
+    def update(self, position):
+        """ Update the weight of the question at 'position' """
+
+        slot = position
+        if self.slots != None:
+            slot = self.slots.get(position)
+            if slot == None:
+                return # Not being asked
+
+        question = self.quiz.questions[position]
+        self.index.update(slot, question.weight(self.quiz.total_questions))
+
+
+    def add(self, position):
+        """ Add the new question at 'position' to the weight index """
+
+        question = self.quiz.questions[position]
+        self.index.append(question.weight(self.quiz.total_questions))
+
+
+    def remove(self, position, moved):
+        """ Move the weight of the question at 'moved' into 'position' """
+
+        self.index.update(position, self.index.weights[moved])
+        self.index.pop()
+
+
+class LeitnerScheduler(Scheduler):
+    """ Leitner box scheduler
+
+        Questions are kept in a heap keyed by the draw they are next due on,
+        so picking the next question is O(log n). Stale heap entries are
+        skipped as they are popped rather than removed eagerly.
+    """
+
+    # The number of draws before a question in each box is due again
+    INTERVALS = (1, 3, 8, 20, 50, 120)
+
+
+    def __init__(self, quiz):
+        """ Put the questions of 'quiz' into boxes and schedule them
+
+            Questions start in a box based on their saved stats, and are
+            all due immediately, in a random order.
+        """
+
+        Scheduler.__init__(self, quiz)
+
+        self.clock = 0 # The number of draws so far
+        self.boxes = []
+        self.correct = [] # The correct count last seen for each question
+        self.due = []
+        for question in quiz.questions:
+            box = max(0, question.correct - question.wrong)
+            self.boxes.append(min(box, len(self.INTERVALS) - 1))
+            self.correct.append(question.correct)
+            self.due.append(0)
+
+        if self.positions == None:
+            self.active = None
+            positions = range(len(quiz.questions))
+        else:
+            self.active = set(self.positions)
+            positions = self.positions
+        self.heap = [(0, random(), position) for position in positions]
+        self.heap.sort()
+
+
+    def schedule(self, position, due):
+        """ Schedule the question at 'position' for the draw 'due' """
+
+        self.due[position] = due
+        heappush(self.heap, (due, random(), position))
+
+
+    def next_question(self):
+        """ Return the position of the question that is due soonest
+
+            The question is provisionally rescheduled as if it were not
+            answered, so that skipped questions still come around again.
+        """
+
+        while True:
+            due, tie, position = heappop(self.heap)
+            if position < len(self.due) and due == self.due[position]:
+                break # Not stale
+
+        self.replay(position)
+        return position
+
+
+    def replay(self, position):
+        """ Move the clock on, and provisionally reschedule the question at
+            'position' as if it were drawn and not answered
+        """
+
+        self.clock += 1
+        box = self.boxes[position]
+        self.schedule(position, self.clock + self.INTERVALS[box])
+
+
+    def update(self, position):
+        """ Move the question at 'position' between boxes
+
+            A correct answer moves the question up a box; a wrong answer
+            moves it back to the first box.
+        """
+
+        if self.active != None and position not in self.active:
+            return # Not being asked
+
+        question = self.quiz.questions[position]
+        if question.correct > self.correct[position]:
+            box = min(self.boxes[position] + 1, len(self.INTERVALS) - 1)
+        else:
+            box = 0
+        self.correct[position] = question.correct
+        self.boxes[position] = box
+        self.schedule(position, self.clock + self.INTERVALS[box])
+
+
+    def add(self, position):
+        """ Box the new question at 'position', and make it due now """
+
+        question = self.quiz.questions[position]
+        box = max(0, question.correct - question.wrong)
+        self.boxes.append(min(box, len(self.INTERVALS) - 1))
+        self.correct.append(question.correct)
+        self.due.append(self.clock)
+        self.schedule(position, self.clock)
+
+
+    def remove(self, position, moved):
+        """ Move the question at 'moved' into 'position'
+
+            The heap entries for the removed question and the old position
+            are left to be skipped as stale.
+        """
+
+        for column in (self.boxes, self.correct, self.due):
+            column[position] = column[moved]
+            column.pop()
+        if position != moved:
+            self.schedule(position, self.due[position])
+
+
+# Schedulers, by name
+SCHEDULERS = {
+    'weighted': WeightedScheduler,
+    'leitner': LeitnerScheduler,
+}
@@ -0,0 +1,198 @@
+""" Headless simulation for Quizzer.
+
+    Runs many simulated learners against a quiz, without any UI, to evaluate
+    how well a scheduler covers a quiz and how quickly learners converge on
+    the right answers. Learners are spread across a process pool; the quiz
+    is parsed once per process and each learner works on a clone of it with
+    its own stats.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import random
+import time
+from multiprocessing import Pool, cpu_count
+
+from basequiz import BaseQuiz, Quiz
+
+# The parsed quiz shared by the learners in this process
+_shared_quiz = None
+
+
+class Learner(object):
+    """ A simulated learner
+
+        The chance of answering a question correctly starts at 'accuracy',
+        and each time the learner is shown the answer to a question the
+        chance of getting it wrong again shrinks by 'learning_rate'.
+    """
+
+    def __init__(self, accuracy=0.5, learning_rate=0.2, seed=None):
+        """ Initialise the learner """
+
+        self.accuracy = accuracy
+        self.learning_rate = learning_rate
+        self.random = random.Random(seed)
+        self.exposures = {} # Question position: times the answer was shown
+
+
+    def answer(self, question):
+        """ Return the learner's answer to 'question' """
+
+        exposures = self.exposures.get(question.position, 0)
+        wrong_chance = (1 - self.accuracy) * \
+                       (1 - self.learning_rate) ** exposures
+        if self.random.random() >= wrong_chance:
+            return question.answer
+
+        if question.sort == 'multichoice':
+            wrong = [choice for choice in question.choices
+                     if choice != question.answer]
+            if len(wrong) != 0:
+                return self.random.choice(wrong)
+        return ""
+
+
+    def learn(self, question):
+        """ Record that the learner was shown the answer to 'question' """
+
+        position = question.position
+        self.exposures[position] = self.exposures.get(position, 0) + 1
+
+
+class SimulatedQuiz(BaseQuiz):
+    """ A headless quiz, answered by a simulated learner """
+
+    def __init__(self, quiz, learner):
+        """ Initialise the simulation of 'learner' working through 'quiz' """
+
+        BaseQuiz.__init__(self)
+        self.quiz = quiz.clone()
+        self.learner = learner
+
+        self.asked = [0] * len(self.quiz.questions)
+        self.results = [] # True/False for each answer, in order
+
+
+    def run(self, questions):
+        """ Ask 'questions' questions """
+
+        for i in range(questions):
+            self.next_question()
+            self.accept_answer()
+
+
+    def summary(self):
+        """ Return a dict summarising how the learner did """
+
+        window = max(1, len(self.results) // 10)
+        first = self.results[:window]
+        last = self.results[-window:]
+        seen = sum(1 for count in self.asked if count != 0)
+        return {'coverage': seen / float(len(self.asked)),
+                'first_accuracy': sum(first) / float(len(first)),
+                'last_accuracy': sum(last) / float(len(last))}
+
+
+    # UI related stuff...
+
+    def load_quiz(self):
+        """ Simulations always have a quiz """
+
+        raise NotImplementedError("SimulatedQuiz is given it's quiz!")
+
+
+    def display_question(self):
+        """ 'Display' the question, by getting the learner's answer """
+
+        self.asked[self.question.position] += 1
+        self.answer = self.learner.answer(self.question)
+
+
+    def set_answer_response(self, answer, correct):
+        """ Record the response and show the learner the answer """
+
+        self.results.append(correct)
+        self.learner.learn(self.question)
+
+
+def _init_worker(quiz_file, scheduler):
+    """ Load the shared quiz, unless it was inherited from the parent """
+
+    global _shared_quiz
+    if _shared_quiz == None:
+        _shared_quiz = Quiz(quiz_file, scheduler=scheduler)
+
+
+def _simulate_chunk(task):
+    """ Simulate a chunk of learners, returning their combined results """
+
+    first, count, questions, accuracy, learning_rate, seed = task
+
+    # Give each chunk it's own (reproducible) scheduler randomness
+    random.seed(seed * 1000003 + first)
+
+    asked = [0] * len(_shared_quiz.questions)
+    summaries = []
+    for learner_id in range(first, first + count):
+        learner = Learner(accuracy, learning_rate, seed * 1000003 + learner_id)
+        simulation = SimulatedQuiz(_shared_quiz, learner)
+        simulation.run(questions)
+        summaries.append(simulation.summary())
+        for position, times in enumerate(simulation.asked):
+            asked[position] += times
+    return summaries, asked
+
+
+def simulate(quiz_file, learners, questions, accuracy=0.5, learning_rate=0.2,
+             scheduler='weighted', jobs=None, seed=0):
+    """ Simulate 'learners' learners answering 'questions' questions each
+
+        Returns a dict of aggregate coverage and convergence stats.
+    """
+
+    global _shared_quiz
+    _shared_quiz = Quiz(quiz_file, scheduler=scheduler)
+
+    if jobs == None:
+        jobs = cpu_count()
+    chunk = max(1, min(64, learners // (jobs * 4)))
+    tasks = [(first, min(chunk, learners - first), questions, accuracy,
+              learning_rate, seed)
+             for first in range(0, learners, chunk)]
+
+    start = time.time()
+    summaries = []
+    asked = [0] * len(_shared_quiz.questions)
+    pool = Pool(jobs, _init_worker, (quiz_file, scheduler))
+    try:
+        for chunk_summaries, chunk_asked in pool.imap_unordered(
+                                                    _simulate_chunk, tasks):
+            summaries.extend(chunk_summaries)
+            for position, times in enumerate(chunk_asked):
+                asked[position] += times
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start
+
+    def mean(key):
+        return sum(summary[key] for summary in summaries) / len(summaries)
+
+    answers = learners * questions
+    return {'quiz': quiz_file,
+            'scheduler': scheduler,
+            'learners': learners,
+            'questions_per_learner': questions,
+            'answers': answers,
+            'seconds': elapsed,
+            'answers_per_second': answers / elapsed if elapsed > 0 else None,
+            'mean_coverage': mean('coverage'),
+            'min_coverage': min(summary['coverage'] for summary in summaries),
+            'mean_first_accuracy': mean('first_accuracy'),
+            'mean_last_accuracy': mean('last_accuracy'),
+            'never_asked': sum(1 for times in asked if times == 0),
+            'most_asked': max(asked),
+            'least_asked': min(asked)}
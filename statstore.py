@@ -0,0 +1,81 @@
+""" Persistent question statistics for Quizzer.
+
+    The right/wrong counts for each question are kept in an SQLite database,
+    so that the question weighting survives between sessions. The database
+    runs in WAL mode with relaxed syncing, and updates are buffered and
+    written in batches, so recording an answer never waits on the disk.
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import sqlite3
+
+from batching import BatchWriter
+
+
+class StatsStore(BatchWriter):
+    """ A store of per question stats, keyed by quiz and question key """
+
+    def __init__(self, path, batch_size=64, flush_interval=5):
+        """ Open (or create) the store at 'path', buffering updates (see
+            BatchWriter)
+        """
+
+        BatchWriter.__init__(self, batch_size, flush_interval)
+        self.path = path
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS stats (
+                                       quiz TEXT NOT NULL,
+                                       question TEXT NOT NULL,
+                                       correct INTEGER NOT NULL,
+                                       wrong INTEGER NOT NULL,
+                                       PRIMARY KEY (quiz, question))""")
+        self.connection.commit()
+
+        self.pending = {} # (quiz, question): (correct, wrong)
+
+
+    def load(self, quiz):
+        """ Return a dict of question key: (correct, wrong) for 'quiz' """
+
+        self.flush()
+        cursor = self.connection.execute(
+                    "SELECT question, correct, wrong FROM stats " +
+                    "WHERE quiz = ?", (quiz,))
+        return dict((question, (correct, wrong))
+                    for question, correct, wrong in cursor)
+
+
+    def record(self, quiz, question, correct, wrong):
+        """ Record the latest stats for a question
+
+            The update is buffered; only the latest stats for each question
+            are kept, so repeated answers collapse into a single write.
+        """
+
+        self.pending[(quiz, question)] = (correct, wrong)
+        self.flush_if_due()
+
+
+    def write_pending(self):
+        """ Write the buffered updates in a single transaction """
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?)",
+                [(quiz, question, correct, wrong)
+                 for (quiz, question), (correct, wrong)
+                 in self.pending.items()])
+        self.pending = {}
+
+
+    def close(self):
+        """ Flush any buffered updates and close the store """
+
+        self.flush()
+        self.connection.close()
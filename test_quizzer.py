@@ -0,0 +1,416 @@
+""" Tests for Quizzer.
+
+    These check the less obvious data structures against simple, slow
+    versions of the same thing, using random inputs from a fixed seed.
+
+    Run with 'python -m unittest test_quizzer' (or pytest).
+
+    Author: Alastair Hughes
+    Contact: <hobbitalastair at yandex dot com>
+
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from basequiz import BaseQuiz, Quiz, QuizException
+from checkpoint import Checkpoint, RECORD
+from quizreload import QuizReloader
+from scheduler import WeightIndex
+
+
+def prefix_find(weights, value):
+    """ Return the first position where the prefix sum of the (clamped)
+        weights exceeds value, by adding them up
+    """
+
+    total = 0
+    for position, weight in enumerate(weights):
+        total += max(weight, 0)
+        if total > value:
+            return position
+    return len(weights)
+
+
+class WeightIndexTest(unittest.TestCase):
+    """ Check WeightIndex against plain prefix sums """
+
+    def check(self, index, weights):
+        """ Check that 'index' matches the list of 'weights' """
+
+        clamped = [max(weight, 0) for weight in weights]
+        self.assertEqual(index.size, len(weights))
+        self.assertEqual(index.weights, clamped)
+        self.assertEqual(index.total(), sum(clamped))
+        for value in range(-1, sum(clamped) + 2):
+            self.assertEqual(index.find(value), prefix_find(weights, value))
+
+
+    def test_build(self):
+        """ Indexes of every small size find the same positions """
+
+        rand = random.Random(1)
+        for size in range(40):
+            weights = [rand.randint(-2, 5) for i in range(size)]
+            self.check(WeightIndex(weights), weights)
+
+
+    def test_changes(self):
+        """ Updates, appends and pops keep the index consistent """
+
+        rand = random.Random(2)
+        weights = [rand.randint(0, 5) for i in range(5)]
+        index = WeightIndex(weights)
+        for step in range(2000):
+            action = rand.random()
+            if action < 0.4 and len(weights) != 0:
+                position = rand.randrange(len(weights))
+                weights[position] = rand.randint(-2, 5)
+                index.update(position, weights[position])
+            elif action < 0.75:
+                weights.append(rand.randint(-2, 5))
+                index.append(weights[-1])
+            elif len(weights) != 0:
+                weights.pop()
+                index.pop()
+            if step % 20 == 0:
+                self.check(index, weights)
+        self.check(index, weights)
+
+
+    def test_sample(self):
+        """ Positions with no weight are never sampled """
+
+        index = WeightIndex([0, 3, 0, -1, 1, 0])
+        for i in range(500):
+            self.assertIn(index.sample(), (1, 4))
+        self.assertIn(WeightIndex([0, 0]).sample(), (0, 1))
+
+
+def quiz_text(questions):
+    """ Return the text of a quiz file with the given questions
+
+        Each question is a (text, answer, explicit id or None, choices or
+        None) tuple.
+    """
+
+    lines = ["# A generated quiz", "@colours", "    r: Red", "    g: Green",
+             ""]
+    for text, answer, question_id, choices in questions:
+        lines.append("{}: {}".format(text, answer))
+        if question_id != None:
+            lines.append("    [{}]".format(question_id))
+        if choices != None:
+            lines.extend("    {}: {}".format(choice_id, choice)
+                         for choice_id, choice in sorted(choices.items()))
+    return "\n".join(lines) + "\n"
+
+
+def rows(quiz):
+    """ Return the set of rows of 'quiz', without the stats """
+
+    return set((question.id, question.question, question.answer,
+                question.normalized, question.sort,
+                tuple(sorted(question.choices.items()))
+                    if question.choices != None else None)
+               for question in quiz.questions)
+
+
+class ReloadTest(unittest.TestCase):
+    """ Check that reloading an edited quiz matches parsing it afresh """
+
+    def setUp(self):
+        """ Make a directory for the quiz files """
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.quiz")
+        self.count = 0 # Questions made so far, to keep them distinct
+
+
+    def tearDown(self):
+        """ Remove the quiz files """
+
+        shutil.rmtree(self.directory)
+
+
+    def new_question(self, rand):
+        """ Return a new, distinct question """
+
+        self.count += 1
+        words = rand.sample(["red", "green", "blue", "sky", "sea"], 2)
+        question_id = None
+        if rand.random() < 0.3:
+            question_id = "q{}".format(self.count)
+        choices = None
+        if rand.random() < 0.2:
+            choices = {'1': "One {}".format(self.count), '2': "Two"}
+            return ("Pick {} {} {}?".format(self.count, *words), "1",
+                    question_id, choices)
+        return ("Question {} {} {}?".format(self.count, *words),
+                "Answer {}".format(self.count), question_id, choices)
+
+
+    def edit(self, questions, rand):
+        """ Return a randomly edited copy of 'questions' """
+
+        edited = []
+        for question in questions:
+            action = rand.random()
+            if action < 0.15:
+                continue # Removed
+            elif action < 0.3:
+                text, answer, question_id, choices = question
+                if choices == None:
+                    answer = answer + " changed"
+                edited.append((text, answer, question_id, choices))
+            else:
+                edited.append(question)
+        for i in range(rand.randint(0, 8)):
+            edited.insert(rand.randint(0, len(edited)),
+                          self.new_question(rand))
+        if rand.random() < 0.3:
+            rand.shuffle(edited)
+        return edited
+
+
+    def write(self, questions):
+        """ Write a quiz file with 'questions' """
+
+        with open(self.path, 'w') as quiz:
+            quiz.write(quiz_text(questions))
+
+
+    def check_reload(self, seed, scheduler, query=None):
+        """ Edit and reload a quiz a few times, checking each reload """
+
+        rand = random.Random(seed)
+        questions = [self.new_question(rand) for i in range(30)]
+        self.write(questions)
+        quiz = Quiz(self.path, scheduler=scheduler)
+        for position in range(len(quiz.questions)):
+            quiz.questions.correct[position] = rand.randint(0, 5)
+            quiz.questions.wrong[position] = rand.randint(0, 5)
+        if query != None:
+            quiz.restrict(quiz.search(query))
+        quiz.get_question() # Build the scheduler
+        reloader = QuizReloader(quiz)
+
+        for step in range(10):
+            stats = dict((question.id, (question.correct, question.wrong))
+                         for question in quiz.questions)
+            before = rows(quiz)
+            active = None
+            if quiz.active != None:
+                active = set(quiz.questions.ids[position]
+                             for position in quiz.active)
+
+            edited = self.edit(questions, rand)
+            self.write(edited)
+            fresh = Quiz(self.path)
+            kept = set(question.id for question in fresh.questions
+                       if question.id in stats)
+            if active != None and len(active & kept) == 0:
+                # Every question being asked was removed
+                self.assertRaises(QuizException, reloader.reload)
+                self.assertEqual(rows(quiz), before)
+                continue
+            reloader.reload()
+            questions = edited
+
+            # The questions match a fresh parse, keeping the old stats
+            self.assertEqual(rows(quiz), rows(fresh))
+            for question in quiz.questions:
+                self.assertEqual((question.correct, question.wrong),
+                                 stats.get(question.id, (0, 0)))
+
+            # The same questions are asked, less those removed
+            if active != None:
+                self.assertEqual(set(quiz.questions.ids[position]
+                                     for position in quiz.active),
+                                 active & kept)
+            elif scheduler == 'weighted':
+                weights = quiz.questions.weights(quiz.total_questions)
+                self.assertEqual(quiz._scheduler.index.weights,
+                                 [max(weight, 0) for weight in weights])
+
+            positions = quiz.active
+            if positions == None:
+                positions = range(len(quiz.questions))
+            for i in range(50):
+                self.assertIn(quiz.get_question().position, positions)
+
+
+    def test_weighted(self):
+        """ Reloads patch the weighted scheduler """
+
+        for seed in range(5):
+            self.check_reload(seed, 'weighted')
+
+
+    def test_leitner(self):
+        """ Reloads patch the Leitner scheduler """
+
+        for seed in range(5):
+            self.check_reload(seed, 'leitner')
+
+
+    def test_restricted(self):
+        """ Reloads keep asking the same questions, less those removed """
+
+        for seed in range(10):
+            self.check_reload(seed, 'weighted', "sky")
+
+
+class ScriptedQuiz(BaseQuiz):
+    """ A quiz with no UI, answered by the test """
+
+    def display_question(self):
+        """ Nothing to show """
+
+        pass
+
+
+    def set_answer_response(self, correct_answer, correct):
+        """ Nothing to show """
+
+        pass
+
+
+def session_state(session):
+    """ Return the state of 'session' that a checkpoint should restore """
+
+    quiz = session.quiz
+    state = {'total_questions': quiz.total_questions,
+             'position': session.question.position,
+             'active': quiz.active,
+             'correct': list(quiz.questions.correct),
+             'wrong': list(quiz.questions.wrong)}
+    scheduler = quiz._scheduler
+    if scheduler == None: # In an exam
+        state['schedule'] = None
+    elif quiz.scheduler == 'leitner':
+        state['schedule'] = (scheduler.clock, scheduler.due,
+                             scheduler.boxes, scheduler.correct)
+    else:
+        state['schedule'] = scheduler.index.weights
+    if session.paper != None:
+        state['paper'] = (session.paper.positions, session.paper.asked,
+                          session.paper.correct)
+    return state
+
+
+class CheckpointTest(unittest.TestCase):
+    """ Check that resuming a checkpoint restores the saved session """
+
+    def setUp(self):
+        """ Write a quiz to check, in a new directory """
+
+        self.directory = tempfile.mkdtemp()
+        self.quiz_file = os.path.join(self.directory, "test.quiz")
+        self.path = os.path.join(self.directory, "test.checkpoint")
+        with open(self.quiz_file, 'w') as quiz:
+            for i in range(40):
+                quiz.write("Question {} {}?: Answer {}\n".format(i,
+                           "sky" if i % 3 == 0 else "sea", i))
+
+
+    def tearDown(self):
+        """ Remove the quiz and checkpoint """
+
+        shutil.rmtree(self.directory)
+
+
+    def run_session(self, answer_seed, answers, **options):
+        """ Answer 'answers' questions (at random, from 'answer_seed'), and
+            return the session
+        """
+
+        rand = random.Random(answer_seed)
+        random.seed(answer_seed)
+        session = ScriptedQuiz(self.quiz_file,
+                               checkpoint=Checkpoint(self.path, batch_size=4),
+                               **options)
+        session.new_quiz()
+        for i in range(answers):
+            if session.question == None:
+                break # The exam is finished
+            if rand.random() < 0.6:
+                session.answer = session.question.answer
+            else:
+                session.answer = "wrong"
+            session.accept_answer()
+            session.next_question()
+        return session
+
+
+    def resume(self, **options):
+        """ Return a new session, resumed from the checkpoint """
+
+        session = ScriptedQuiz(checkpoint=Checkpoint(self.path), resume=True,
+                               **options)
+        session.new_quiz()
+        return session
+
+
+    def check_resume(self, answer_seed, answers, **options):
+        """ Check that a resumed session matches the saved one """
+
+        session = self.run_session(answer_seed, answers, **options)
+        session.checkpoint.flush()
+        resumed = self.resume(**options)
+        self.assertEqual(session_state(resumed), session_state(session))
+
+
+    def test_weighted(self):
+        """ Sessions using the weighted scheduler are restored """
+
+        for seed, answers in enumerate((1, 3, 10, 57, 300)):
+            self.check_resume(seed, answers)
+
+
+    def test_leitner(self):
+        """ Sessions using the Leitner scheduler are restored """
+
+        for seed, answers in enumerate((1, 3, 10, 57, 300)):
+            self.check_resume(seed, answers, scheduler='leitner')
+
+
+    def test_filtered(self):
+        """ The questions being asked are restored """
+
+        for seed, answers in enumerate((2, 30, 200)):
+            self.check_resume(seed, answers, question_filter="sky",
+                              scheduler='leitner')
+
+
+    def test_exam(self):
+        """ The progress through an exam paper is restored """
+
+        for answers in range(1, 8):
+            self.check_resume(answers, answers, exam=8, seed=answers)
+
+
+    def test_partial_record(self):
+        """ A partly written record is dropped, and later records line up """
+
+        session = self.run_session(0, 20, scheduler='leitner')
+        session.checkpoint.flush()
+        with open(self.path, 'ab') as checkpoint:
+            checkpoint.write(b'\0' * (RECORD.size // 2))
+        resumed = self.resume()
+        self.assertEqual(session_state(resumed), session_state(session))
+
+        for i in range(10):
+            resumed.answer = "wrong"
+            resumed.accept_answer()
+            resumed.next_question()
+        resumed.checkpoint.flush()
+        self.assertEqual(session_state(self.resume()),
+                         session_state(resumed))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,7 +15,73 @@ from tkinter import messagebox
 from basequiz import BaseQuiz, \
                      Quiz, \
                      Question, \
-                     QuizException
+                     QuizException, \
+                     VERSION
+
+class QuestionPanel(ttk.Frame):
+    """ A reusable panel showing a single question
+
+        The widgets are created once and reconfigured for each question;
+        radio buttons are pooled, growing to fit the question with the most
+        choices seen so far.
+    """
+
+    def __init__(self, master, variable):
+        """ Initialise the panel, with radio buttons bound to 'variable' """
+
+        ttk.Frame.__init__(self, master)
+
+        self.variable = variable
+        self.question = None # The question currently laid out
+
+        # The main question header
+        self.header = ttk.Label(self)
+        self.header.pack(side='top')
+
+        # The answer entry, for prompt questions
+        self.entry = ttk.Entry(self)
+
+        # The choice roundbuttons, for multichoice questions
+        self.choices = ttk.Frame(self)
+        self.radios = []
+
+
+    def show(self, question, order=None):
+        """ Lay out 'question' in the panel
+
+            'order' is the order to show the choice ids in, if multichoice.
+        """
+
+        self.question = question
+        self.header.configure(text=question.question)
+
+        # Setup the UI depending on question sort
+        sort = question.sort
+        if sort == 'prompt':
+            self.choices.pack_forget()
+            self.entry.delete(0, 'end')
+            self.entry.pack()
+        elif sort == 'multichoice':
+            self.entry.pack_forget()
+            if order == None:
+                order = list(question.choices)
+            choices = [(choice_id, question.choices[choice_id])
+                       for choice_id in order]
+
+            # Grow the pool of radio buttons if needed
+            while len(self.radios) < len(choices):
+                self.radios.append(ttk.Radiobutton(self.choices,
+                                                   variable=self.variable))
+
+            for radio, (choice_id, choice) in zip(self.radios, choices):
+                radio.configure(text=choice, value=choice_id)
+                radio.pack()
+            for radio in self.radios[len(choices):]:
+                radio.pack_forget()
+            self.choices.pack()
+        else:
+            raise ValueError("Unknown question sort {}!".format(sort))
+
 
 class TkQuiz(tk.Frame, BaseQuiz):
     """ Tkinter Quizzer UI """
@@ -69,8 +135,15 @@ class TkQuiz(tk.Frame, BaseQuiz):
         self.next_button_text.set("Accept")
         accept_button.pack()
 
-        # Placeholder question UI
-        self.question_ui = ttk.Frame(self)
+        # Two question panels; one is shown while the other is prepared
+        self.shown_panel = QuestionPanel(self, self._answer)
+        self.next_panel = QuestionPanel(self, self._answer)
+
+        # The response to an answer
+        self.response = ttk.Label(self)
+
+        # The next question, chosen while the last answer was shown
+        self.prefetched = None # (quiz, question)
 
 
     def accept(self):
@@ -96,7 +169,7 @@ class TkQuiz(tk.Frame, BaseQuiz):
         """ Return the current answer """
 
         if self.question.sort == 'prompt':
-            return self.question_choices.get().strip()
+            return self.shown_panel.entry.get().strip()
         else:
             return self._answer.get()
 
@@ -116,7 +189,7 @@ class TkQuiz(tk.Frame, BaseQuiz):
         self.master.withdraw() # Hide the main window
 
         try:
-            self.quiz = Quiz(filedialog.askopenfilename())
+            self.quiz = self.open_quiz(filedialog.askopenfilename())
         except QuizException as error:
             tk.messagebox.showerror("Quiz error",
                "Quiz could not be loaded because error \
@@ -128,55 +201,85 @@ class TkQuiz(tk.Frame, BaseQuiz):
         self.master.deiconify() # Recreate the main window
 
 
+    def next_question(self):
+        """ Move onto the next question, using any prefetched question """
+
+        if self.prefetched == None or self.prefetched[0] is not self.quiz:
+            BaseQuiz.next_question(self)
+        else:
+            self.question = None
+            self.answer = None
+
+            self.question = self.prefetched[1]
+            self.question_asked()
+            self.display_question()
+        self.prefetched = None
+
+
+    def prefetch_question(self):
+        """ Choose the next question and lay it out in the hidden panel """
+
+        self.check_reload()
+        try:
+            question = self.draw_question()
+        except QuizException:
+            return # Handled when the question is needed, by next_question
+        if question == None:
+            return # The exam is finished
+        self.prefetched = (self.quiz, question)
+        self.next_panel.show(question, self.choice_order(question))
+
+
     def display_question(self):
         """ Display the current question
-        
-            Also make sure that the current button text is correct
-        """
 
-        # First, clear the current question ui
-        self.question_ui.destroy()
-        # Create a new frame for the question
-        self.question_ui = ttk.Frame(self)
+            The question is laid out in the hidden panel (unless it already
+            was, by prefetch_question), and then the panels are swapped.
+        """
 
-        # Create the main question header
-        question = ttk.Label(self.question_ui,
-                             text=self.question.question)
-        question.pack(side='top')
+        if self.next_panel.question != self.question:
+            self.next_panel.show(self.question,
+                                 self.choice_order(self.question))
+        self._answer.set("")
 
-        # Show the possible choices
-        # Setup a new UI depending on question sort
-        sort = self.question.sort
-        if sort == 'prompt':
-            self.question_choices = ttk.Entry(self.question_ui)
-        elif sort == 'multichoice':
-            # Create the choice roundbutton set
-            self.question_choices = ttk.Frame(self.question_ui)
-            for choice_id, choice in self.question.choices.items():
-                radio = ttk.Radiobutton(self.question_choices,
-                                        text=choice,
-                                        variable=self._answer,
-                                        value=choice_id)
-                radio.pack()
-        else:
-            raise ValueError("Unknown question sort {}!".format(sort))
-
-        # Pack the UI components
-        self.question_choices.pack()
-        self.question_ui.pack(side='top')
+        self.response.pack_forget()
+        self.shown_panel.pack_forget()
+        self.shown_panel, self.next_panel = self.next_panel, self.shown_panel
+        self.next_panel.question = None # Now out of date
+        self.shown_panel.pack(side='top')
+        if self.question.sort == 'prompt':
+            self.shown_panel.entry.focus_set()
 
 
     def set_answer_response(self, correct_answer, correct):
-        """ Set the current answer response """
+        """ Set the current answer response
+
+            While the response is shown, the next question is prepared.
+        """
 
         if correct:
             answer = "Answer {} was correct!".format(correct_answer)
         else:
             answer = "Wrong! The correct answer was {}".format(correct_answer)
 
-        self.question_ui.destroy()
-        self.question_ui = ttk.Label(self, text=answer)
-        self.question_ui.pack(side='top')
+        self.shown_panel.pack_forget()
+        self.response.configure(text=answer)
+        self.response.pack(side='top')
+
+        self.prefetch_question()
+
+
+    def report_skipped(self, message):
+        """ Warn about a question that could not be asked """
+
+        messagebox.showwarning("Question skipped", message)
 
 
+    def exam_finished(self):
+        """ Show the exam result, and finish """
 
+        messagebox.showinfo("Exam finished",
+                            "You answered {} of {} questions correctly."
+                            .format(self.paper.correct, len(self.paper)))
+        BaseQuiz.exam_finished(self)
+        self.master.destroy()